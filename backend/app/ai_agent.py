@@ -112,7 +112,8 @@ Respond ONLY with valid JSON (no markdown):
     "explanation": "brief explanation of the column's expected data"
 }}
 
-Possible rule types: not_null, unique, range, regex, min_length, max_length
+Possible rule types: not_null, unique, range (min, max), regex (pattern),
+in_set (values), min_length (length), max_length (length)
 """
 
     response = get_client().chat.completions.create(
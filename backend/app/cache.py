@@ -0,0 +1,94 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import pandas as pd
+
+# Бюджет памяти процесса под загруженные DataFrame
+DATAFRAME_CACHE_MB = int(os.getenv("DATAFRAME_CACHE_MB", 1024))
+
+
+class DataFrameCache:
+    """LRU-кэш загруженных DataFrame с вытеснением по бюджету памяти
+
+    Ключ — (dataset_id, token, columns): token меняется вместе с содержимым
+    файла (content_hash или mtime), columns — кортеж колонок проекции или None
+    для всей таблицы. Размер записи считается через memory_usage(deep=True).
+    Возвращаемые DataFrame общие для всех запросов — их нельзя изменять.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (df, bytes)
+        self._lock = threading.Lock()
+
+    def get(self, dataset_id: int, token: str, columns: Optional[list] = None) -> Optional[pd.DataFrame]:
+        key = (dataset_id, token, tuple(columns) if columns else None)
+        full_key = (dataset_id, token, None)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+
+            # Проекцию можно взять из уже загруженной полной таблицы
+            if columns and full_key in self._entries:
+                self._entries.move_to_end(full_key)
+                self.hits += 1
+                return self._entries[full_key][0][list(columns)]
+
+            self.misses += 1
+            return None
+
+    def put(self, dataset_id: int, token: str, df: pd.DataFrame, columns: Optional[list] = None) -> None:
+        nbytes = int(df.memory_usage(deep=True).sum())
+        if nbytes > self.max_bytes:
+            return
+
+        key = (dataset_id, token, tuple(columns) if columns else None)
+        with self._lock:
+            # Записи старой версии файла больше не понадобятся
+            for old in [k for k in self._entries if k[0] == dataset_id and k[1] != token]:
+                self._drop(old)
+
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (df, nbytes)
+            self.size += nbytes
+
+            while self.size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate(self, dataset_id: int) -> None:
+        """Удаляем все записи датасета (например, при его удалении)"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == dataset_id]:
+                self._drop(key)
+
+    def _drop(self, key) -> None:
+        _, nbytes = self._entries.pop(key)
+        self.size -= nbytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_mb": round(self.size / 1024 / 1024, 2),
+                "max_size_mb": round(self.max_bytes / 1024 / 1024, 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total * 100, 2) if total else 0
+            }
+
+
+dataframe_cache = DataFrameCache(DATAFRAME_CACHE_MB * 1024 * 1024)
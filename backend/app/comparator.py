@@ -2,9 +2,153 @@ import pandas as pd
 import numpy as np
 from typing import Optional
 
+from .drift import distribution_drift, sorted_quantiles, value_counts_sketch
+
+
+# Откуда берутся метрики версий: profile — из сохранённых профилей, raw — из файлов,
+# auto — из профиля, а для версии без подходящего профиля — из файла
+COMPARE_SOURCES = ("auto", "profile", "raw")
+
+# Типы колонок, для которых сравнивается среднее
+MEAN_DTYPES = ("int64", "float64")
+
+# Типы без пропусков-объектов: колонки такого типа обрабатываются одним 2D-массивом
+BLOCK_DTYPES = ("float64", "int64", "bool")
+
+
+def _sorted_duplicates(ordered: np.ndarray) -> np.ndarray:
+    """Повторы в каждой колонке 2D-блока, отсортированного по оси 0: сравнение соседей
+
+    Те же правила, что у count_duplicates(column_hash(...)): все NaN равны
+    между собой, -0.0 равен 0.0.
+    """
+    if len(ordered) < 2:
+        return np.zeros(ordered.shape[1], dtype=np.int64)
+    dups = np.count_nonzero(ordered[1:] == ordered[:-1], axis=0)
+    if ordered.dtype.kind == "f":
+        dups += np.maximum(np.count_nonzero(np.isnan(ordered), axis=0) - 1, 0)
+    return dups
+
+
+def column_stats(df: pd.DataFrame) -> pd.DataFrame:
+    """Пропуски, повторы и среднее по всем колонкам (индекс — имена) — операциями над блоками, без цикла по колонкам
+
+    Числовые и bool-колонки одного типа обрабатываются одним 2D-массивом
+    (isnan, сортировка, mean); из той же сортировки берутся перцентили для
+    тестов дрейфа. Остальные — одним factorize на колонку: он даёт пропуски
+    (код -1), число уникальных и счётчики значений.
+    """
+
+    columns = list(df.columns)
+    stats = pd.DataFrame({
+        "rows": len(df),
+        "missing": np.zeros(len(columns), dtype=np.int64),
+        "duplicates": np.zeros(len(columns), dtype=np.int64),
+        "mean": np.nan
+    })
+    quantiles = [None] * len(columns)
+    value_counts = [None] * len(columns)
+
+    dtypes = df.dtypes.astype(str).to_numpy()
+    for kind in BLOCK_DTYPES:
+        positions = np.flatnonzero(dtypes == kind)
+        if len(positions) == 0:
+            continue
+        frame = df if len(positions) == len(columns) else df.iloc[:, positions]
+        block = frame.to_numpy(dtype=kind)
+        ordered = np.sort(block, axis=0)
+        if kind == "float64":
+            stats.loc[positions, "missing"] = np.count_nonzero(np.isnan(block), axis=0)
+        stats.loc[positions, "duplicates"] = _sorted_duplicates(ordered)
+
+        if kind in MEAN_DTYPES:
+            stats.loc[positions, "mean"] = frame.mean().to_numpy()
+            present = len(df) - stats.loc[positions, "missing"].to_numpy()
+            for position, column_quantiles, count in zip(positions, sorted_quantiles(ordered, present), present):
+                quantiles[position] = column_quantiles.tolist() if count else None
+        else:
+            trues = np.count_nonzero(block, axis=0)
+            for position, count in zip(positions, trues):
+                value_counts[position] = value_counts_sketch(np.array([count, len(df) - count]), [True, False])
+
+    for position in np.flatnonzero(~np.isin(dtypes, BLOCK_DTYPES)):
+        codes, uniques = pd.factorize(df.iloc[:, position])
+        missing = int(np.count_nonzero(codes == -1))
+        stats.loc[position, "missing"] = missing
+        stats.loc[position, "duplicates"] = len(df) - len(uniques) - (1 if missing else 0)
+        value_counts[position] = value_counts_sketch(np.bincount(codes[codes >= 0], minlength=len(uniques)), uniques)
+
+    stats["has_mean"] = np.isin(dtypes, MEAN_DTYPES)
+    stats["quantiles"] = pd.Series(quantiles, dtype=object)
+    stats["value_counts"] = pd.Series(value_counts, dtype=object)
+    stats.index = pd.Index(columns)
+    return stats
+
+
+def quality_drift(old: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """Дрейф по колонкам из двух column_stats (строки — одни и те же колонки по порядку)
+
+    Проценты, разницы и статусы считаются для всех колонок сразу, статусы —
+    через np.select по тем же порогам. Тесты распределений — drift.py.
+    """
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        missing_old = np.round(old["missing"].to_numpy() / old["rows"].to_numpy() * 100, 2)
+        missing_new = np.round(new["missing"].to_numpy() / new["rows"].to_numpy() * 100, 2)
+        dups_old = np.round(old["duplicates"].to_numpy() / old["rows"].to_numpy() * 100, 2)
+        dups_new = np.round(new["duplicates"].to_numpy() / new["rows"].to_numpy() * 100, 2)
+
+        mean_old = old["mean"].to_numpy(dtype=np.float64)
+        mean_new = new["mean"].to_numpy(dtype=np.float64)
+        has_mean = (old["has_mean"].to_numpy() & new["has_mean"].to_numpy()
+                    & ~np.isnan(mean_old) & ~np.isnan(mean_new) & (mean_old != 0))
+        mean_change = np.round(np.where(has_mean, (mean_new - mean_old) / np.abs(mean_old) * 100, 0), 2)
+
+    missing_diff = np.round(missing_new - missing_old, 2)
+    change = np.abs(mean_change)
+    distribution = distribution_drift(old.reset_index(drop=True), new.reset_index(drop=True))
+
+    return pd.concat([pd.DataFrame({
+        "missing_old": missing_old,
+        "missing_new": missing_new,
+        "missing_diff": missing_diff,
+        "missing_status": np.select([missing_diff < -2, missing_diff > 2], ["improved", "degraded"], "stable"),
+        "duplicates_diff": np.round(dups_new - dups_old, 2),
+        "has_mean": has_mean,
+        "mean_old": mean_old,
+        "mean_new": mean_new,
+        "mean_change_pct": mean_change,
+        "mean_status": np.select([change > 20, change > 5], ["significant_change", "moderate_change"], "stable")
+    }), distribution], axis=1)
+
+
+def profile_stats(profile: dict) -> Optional[pd.DataFrame]:
+    """Та же таблица, что column_stats, из сохранённого профиля; None — если в профиле нет column_summary"""
+
+    summary = profile.get("column_summary")
+    columns = profile.get("columns")
+    if summary is None or columns is None or any(col not in summary for col in columns):
+        return None
+
+    dtypes = np.array([profile["dtypes"].get(col, "object") for col in columns], dtype=object)
+    return pd.DataFrame({
+        "rows": profile["total_rows"],
+        "missing": [profile["missing_values"][col] for col in columns],
+        "duplicates": [summary[col]["duplicates"] for col in columns],
+        "mean": [np.nan if summary[col]["mean"] is None else summary[col]["mean"] for col in columns],
+        "has_mean": np.isin(dtypes, MEAN_DTYPES),
+        "quantiles": pd.Series([summary[col].get("quantiles") for col in columns], dtype=object).to_numpy(),
+        "value_counts": pd.Series([summary[col].get("value_counts") for col in columns], dtype=object).to_numpy()
+    }, index=pd.Index(columns, dtype=object))
+
 
 def compare_versions(df_old: pd.DataFrame, df_new: pd.DataFrame) -> dict:
     """Сравниваем два датасета и находим изменения"""
+    return compare_stats(column_stats(df_old), column_stats(df_new), len(df_old), len(df_new))
+
+
+def compare_stats(old: pd.DataFrame, new: pd.DataFrame, old_rows: int, new_rows: int) -> dict:
+    """Отчёт о дрейфе по двум таблицам column_stats / profile_stats (индекс — колонки в порядке файла)"""
 
     result = {
         "row_changes": {},
@@ -14,8 +158,6 @@ def compare_versions(df_old: pd.DataFrame, df_new: pd.DataFrame) -> dict:
     }
 
     # ── Изменения строк ───────────────────────────────────────────────────────
-    old_rows = len(df_old)
-    new_rows = len(df_new)
     row_diff = new_rows - old_rows
 
     result["row_changes"] = {
@@ -33,12 +175,13 @@ def compare_versions(df_old: pd.DataFrame, df_new: pd.DataFrame) -> dict:
         result["summary"].append("→ Row count unchanged")
 
     # ── Изменения колонок ─────────────────────────────────────────────────────
-    old_cols = set(df_old.columns)
-    new_cols = set(df_new.columns)
+    # Порядок — как в файлах, чтобы ответ не зависел от порядка обхода set
+    old_set = set(old.index)
+    new_set = set(new.index)
 
-    added_cols   = list(new_cols - old_cols)
-    removed_cols = list(old_cols - new_cols)
-    common_cols  = list(old_cols & new_cols)
+    added_cols   = [c for c in new.index if c not in old_set]
+    removed_cols = [c for c in old.index if c not in new_set]
+    common_cols  = [c for c in old.index if c in new_set]
 
     result["column_changes"] = {
         "added":   added_cols,
@@ -52,64 +195,61 @@ def compare_versions(df_old: pd.DataFrame, df_new: pd.DataFrame) -> dict:
         result["summary"].append(f"⚠ Removed columns: {', '.join(removed_cols)}")
 
     # ── Дрейф качества по общим колонкам ─────────────────────────────────────
-    for col in common_cols:
-        drift = {}
-
-        # Изменение пропусков
-        old_missing = round(df_old[col].isnull().sum() / len(df_old) * 100, 2)
-        new_missing = round(df_new[col].isnull().sum() / len(df_new) * 100, 2)
-        missing_diff = round(new_missing - old_missing, 2)
-
-        drift["missing_old"] = old_missing
-        drift["missing_new"] = new_missing
-        drift["missing_diff"] = missing_diff
-        drift["missing_status"] = (
-            "improved" if missing_diff < -2 else
-            "degraded" if missing_diff > 2  else
-            "stable"
-        )
-
-        # Изменение дубликатов
-        old_dups = round(df_old[col].duplicated().sum() / len(df_old) * 100, 2)
-        new_dups = round(df_new[col].duplicated().sum() / len(df_new) * 100, 2)
-        drift["duplicates_diff"] = round(new_dups - old_dups, 2)
-
-        # Статистика для числовых колонок
-        if df_old[col].dtype in ['int64', 'float64'] and df_new[col].dtype in ['int64', 'float64']:
-            old_mean = df_old[col].mean()
-            new_mean = df_new[col].mean()
-
-            if not pd.isna(old_mean) and not pd.isna(new_mean) and old_mean != 0:
-                mean_change = round((new_mean - old_mean) / abs(old_mean) * 100, 2)
-                drift["mean_old"]    = round(float(old_mean), 2)
-                drift["mean_new"]    = round(float(new_mean), 2)
-                drift["mean_change_pct"] = mean_change
-                drift["mean_status"] = (
-                    "significant_change" if abs(mean_change) > 20 else
-                    "moderate_change"    if abs(mean_change) > 5  else
-                    "stable"
+    drift = quality_drift(old.loc[common_cols], new.loc[common_cols])
+
+    for col, row in zip(common_cols, drift.itertuples(index=False)):
+        entry = {
+            "missing_old": row.missing_old,
+            "missing_new": row.missing_new,
+            "missing_diff": row.missing_diff,
+            "missing_status": row.missing_status,
+            "duplicates_diff": row.duplicates_diff
+        }
+
+        if row.has_mean:
+            entry["mean_old"]        = round(float(row.mean_old), 2)
+            entry["mean_new"]        = round(float(row.mean_new), 2)
+            entry["mean_change_pct"] = row.mean_change_pct
+            entry["mean_status"]     = row.mean_status
+
+            if abs(row.mean_change_pct) > 20:
+                result["summary"].append(
+                    f"⚠ Column '{col}' mean changed significantly: "
+                    f"{round(float(row.mean_old),1)} → {round(float(row.mean_new),1)} ({row.mean_change_pct:+.1f}%)"
                 )
 
-                if abs(mean_change) > 20:
-                    result["summary"].append(
-                        f"⚠ Column '{col}' mean changed significantly: "
-                        f"{round(float(old_mean),1)} → {round(float(new_mean),1)} ({mean_change:+.1f}%)"
-                    )
+        # Тесты распределения: PSI/KS для чисел, хи-квадрат/JS для категорий
+        if isinstance(row.distribution_status, str):
+            if pd.notna(row.psi):
+                entry["psi"]          = round(float(row.psi), 4)
+                entry["ks_statistic"] = round(float(row.ks_statistic), 4)
+                entry["ks_p_value"]   = round(float(row.ks_p_value), 4)
+                measure = f"PSI {entry['psi']}"
+            else:
+                entry["chi2"]         = round(float(row.chi2), 2)
+                entry["chi2_p_value"] = round(float(row.chi2_p_value), 4)
+                entry["js_distance"]  = round(float(row.js_distance), 4)
+                measure = f"JS distance {entry['js_distance']}"
+            entry["distribution_status"] = row.distribution_status
+
+            if row.distribution_status == "significant_shift":
+                result["summary"].append(f"⚠ Column '{col}' distribution shifted ({measure})")
 
         # Сохраняем только если есть изменения
-        if abs(missing_diff) > 0 or drift.get("mean_change_pct", 0) != 0:
-            result["quality_drift"][col] = drift
+        if abs(row.missing_diff) > 0 or entry.get("mean_change_pct", 0) != 0 \
+                or entry.get("distribution_status", "stable") != "stable":
+            result["quality_drift"][col] = entry
 
         # Предупреждение если пропуски выросли
-        if missing_diff > 5:
+        if row.missing_diff > 5:
             result["summary"].append(
                 f"⚠ Column '{col}' missing values increased: "
-                f"{old_missing}% → {new_missing}%"
+                f"{row.missing_old}% → {row.missing_new}%"
             )
-        elif missing_diff < -5:
+        elif row.missing_diff < -5:
             result["summary"].append(
                 f"✓ Column '{col}' missing values decreased: "
-                f"{old_missing}% → {new_missing}%"
+                f"{row.missing_old}% → {row.missing_new}%"
             )
 
     # Если нет изменений
@@ -134,6 +274,9 @@ def calculate_drift_score(comparison: dict) -> dict:
         if drift.get("mean_status") == "significant_change":
             issues += 1
 
+        if drift.get("distribution_status") == "significant_shift":
+            issues += 1
+
     if comparison["column_changes"]["removed"]:
         issues += len(comparison["column_changes"]["removed"])
 
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -12,6 +12,60 @@ engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Колонки, добавленные в уже существующие таблицы: create_all их не создаёт
+ADDED_COLUMNS = {
+    "datasets": ["content_hash", "delimiter", "encoding"],
+}
+
+
+# Индексы, добавленные к уже существующим таблицам, и запрос, который перед
+# созданием уникального индекса убирает мешающие ему строки (это кэш)
+ADDED_INDEXES = {
+    "version_drifts": (
+        "ux_version_drifts_pair",
+        "DELETE FROM version_drifts WHERE old_hash = '' OR new_hash = '' OR id NOT IN "
+        "(SELECT MIN(id) FROM version_drifts GROUP BY old_hash, new_hash)"
+    ),
+}
+
+
+def upgrade_schema(metadata) -> None:
+    """Добавляем недостающие колонки из ADDED_COLUMNS в существующие таблицы
+
+    Идемпотентно: вызывается при каждом старте после create_all. Старые
+    строки получают значение по умолчанию колонки, индексы по добавленным
+    колонкам и из ADDED_INDEXES создаются, если их ещё нет.
+    """
+
+    existing = inspect(engine)
+    tables = set(existing.get_table_names())
+    if_not_exists = "IF NOT EXISTS " if engine.dialect.name == "postgresql" else ""
+    with engine.begin() as conn:
+        for table_name, column_names in ADDED_COLUMNS.items():
+            if table_name not in tables:
+                continue
+            present = {column["name"] for column in existing.get_columns(table_name)}
+            for name in column_names:
+                if name in present:
+                    continue
+                column = metadata.tables[table_name].columns[name]
+                ddl = f"ALTER TABLE {table_name} ADD COLUMN {if_not_exists}{name} {column.type.compile(engine.dialect)}"
+                if column.default is not None and column.default.is_scalar:
+                    ddl += f" DEFAULT '{column.default.arg}'"
+                conn.execute(text(ddl))
+            for index in metadata.tables[table_name].indexes:
+                if any(column.name in column_names for column in index.columns):
+                    index.create(bind=conn, checkfirst=True)
+        for table_name, (index_name, cleanup) in ADDED_INDEXES.items():
+            if table_name not in tables:
+                continue
+            if index_name in {index["name"] for index in existing.get_indexes(table_name)}:
+                continue
+            conn.execute(text(cleanup))
+            index = next(i for i in metadata.tables[table_name].indexes if i.name == index_name)
+            index.create(bind=conn, checkfirst=True)
+
+
 def get_db():
     db = SessionLocal()
     try:
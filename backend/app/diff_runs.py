@@ -0,0 +1,217 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from . import models
+from .storage import UPLOAD_DIR, cache_token, load_dataframe, iter_chunks, read_rows
+from .jobs import resolve_engine, PROFILE_CHUNK_ROWS
+from .differ import diff_versions
+
+# Результаты diff: diffs/<старая>-<новая>-<ключ>-<движок>/{inserted,deleted,updated,changed}.npy
+DIFF_DIR = UPLOAD_DIR / "diffs"
+
+
+def diff_hash(old: models.Dataset, new: models.Dataset, key_columns: list) -> str:
+    """Хеш содержимого обеих версий и ключа — изменение любого требует пересчёта"""
+    payload = json.dumps([cache_token(old), cache_token(new), key_columns])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _files(row_diff: models.RowDiff) -> dict:
+    return {name: os.path.join(row_diff.path, f"{name}.npy") for name in ("inserted", "deleted", "updated", "changed")}
+
+
+def diff_available(row_diff: Optional[models.RowDiff]) -> bool:
+    """Файлы с позициями строк diff на месте"""
+    return row_diff is not None and all(os.path.exists(path) for path in _files(row_diff).values())
+
+
+def _reader(dataset: models.Dataset, engine: str):
+    """read_chunks(text_columns) для differ: весь DataFrame одним чанком или файл по чанкам"""
+    if engine == "chunked":
+        return lambda text_columns: iter_chunks(dataset, PROFILE_CHUNK_ROWS, text_columns)
+    return lambda text_columns: iter([load_dataframe(dataset)])
+
+
+def run_diff(
+    db: Session,
+    old: models.Dataset,
+    new: models.Dataset,
+    key_columns: list,
+    engine: str = "auto"
+) -> models.RowDiff:
+    """Построчный diff двух версий с сохранением результата
+
+    Если содержимое обеих версий, ключ и выбранный движок не менялись,
+    возвращается прошлый diff без чтения файлов. engine=chunked (или auto,
+    если хотя бы одна версия большая) читает обе версии потоково и
+    соединяет их через диск.
+    ValueError — ключевой колонки нет в одной из версий.
+    """
+
+    chunked = "chunked" in (resolve_engine(old, engine), resolve_engine(new, engine))
+    resolved = "chunked" if chunked else "memory"
+
+    key = diff_hash(old, new, key_columns)
+    previous = db.query(models.RowDiff) \
+        .filter(models.RowDiff.dataset_id == old.id) \
+        .filter(models.RowDiff.other_id == new.id) \
+        .filter(models.RowDiff.diff_key == key) \
+        .filter(models.RowDiff.engine == resolved) \
+        .order_by(models.RowDiff.id.desc()) \
+        .first()
+    if diff_available(previous):
+        return previous
+
+    DIFF_DIR.mkdir(parents=True, exist_ok=True)
+    target = DIFF_DIR / f"{old.id}-{new.id}-{key[:16]}-{resolved}"
+    with tempfile.TemporaryDirectory(dir=DIFF_DIR) as spill_dir:
+        result = diff_versions(_reader(old, resolved), _reader(new, resolved), key_columns, spill_dir)
+
+        shutil.rmtree(target, ignore_errors=True)
+        target.mkdir()
+        for name in ("inserted", "deleted", "updated"):
+            np.save(target / f"{name}.npy", result[name])
+        changed = result["changed"]
+        del result["changed"]
+        os.replace(changed.filename, target / "changed.npy")
+
+    row_diff = models.RowDiff(
+        dataset_id=old.id,
+        other_id=new.id,
+        diff_key=key,
+        key_columns=result["key_columns"],
+        engine=resolved,
+        old_rows=result["old_rows"],
+        new_rows=result["new_rows"],
+        inserted=len(result["inserted"]),
+        deleted=len(result["deleted"]),
+        updated=len(result["updated"]),
+        unchanged=result["unchanged"],
+        columns={
+            "compared": result["compared_columns"],
+            "added": result["added_columns"],
+            "removed": result["removed_columns"],
+            "retyped": result["retyped_columns"]
+        },
+        column_changes=result["column_changes"],
+        duplicate_keys=result["duplicate_keys"],
+        path=str(target)
+    )
+    db.add(row_diff)
+    db.commit()
+    db.refresh(row_diff)
+    return row_diff
+
+
+def find_diff(db: Session, dataset_id: int, diff_id: int) -> Optional[models.RowDiff]:
+    """diff, в котором датасет участвует как старая или новая версия"""
+    return db.query(models.RowDiff) \
+        .filter(models.RowDiff.id == diff_id) \
+        .filter((models.RowDiff.dataset_id == dataset_id) | (models.RowDiff.other_id == dataset_id)) \
+        .first()
+
+
+def delete_diffs(db: Session, dataset: models.Dataset) -> None:
+    """Удаляем diff'ы, где датасет — старая или новая версия, вместе с файлами"""
+
+    diffs = db.query(models.RowDiff) \
+        .filter((models.RowDiff.dataset_id == dataset.id) | (models.RowDiff.other_id == dataset.id)) \
+        .all()
+    for row_diff in diffs:
+        if row_diff.path:
+            shutil.rmtree(row_diff.path, ignore_errors=True)
+        db.delete(row_diff)
+    db.commit()
+
+
+def _cells(rows: pd.DataFrame, limit: int) -> list:
+    """Строки как словари текстовых значений (обрезанных, как в примерах нарушений)"""
+    columns = {name: [str(v)[:limit] for v in cells] for name, cells in rows.to_dict("list").items()}
+    return [{name: cells[i] for name, cells in columns.items()} for i in range(len(rows))]
+
+
+def _rows_at(dataset: models.Dataset, positions: np.ndarray) -> pd.DataFrame:
+    """Строки по позициям в заданном порядке (read_rows ждёт отсортированные позиции)"""
+    order = np.argsort(positions, kind="stable")
+    rows = read_rows(dataset, positions[order])
+    return rows.iloc[np.argsort(order, kind="stable")]
+
+
+def diff_page(row_diff: models.RowDiff, change: str, cursor: int, limit: int) -> dict:
+    """Страница строк одного вида изменений в порядке строк
+
+    inserted — строки новой версии, deleted — старой, updated — ключ и
+    только изменившиеся колонки (старое и новое значение). Позиции
+    берутся срезом из .npy (memmap), строки — read_rows.
+    """
+
+    files = _files(row_diff)
+    total = getattr(row_diff, change)
+    positions = np.load(files[change], mmap_mode="r")[cursor:cursor + limit] if total else np.empty(0)
+    key_columns = row_diff.key_columns
+
+    changes = []
+    if len(positions) and change in ("inserted", "deleted"):
+        dataset = row_diff.other if change == "inserted" else row_diff.dataset
+        rows = _rows_at(dataset, np.asarray(positions, dtype=np.int64))
+        for position, data in zip(positions, _cells(rows, 50)):
+            changes.append({
+                "row_index": int(position),
+                "key": {col: data[col] for col in key_columns},
+                "row_data": data
+            })
+    elif len(positions):
+        pairs = np.asarray(positions, dtype=np.int64)
+        changed = np.load(files["changed"], mmap_mode="r")[cursor:cursor + limit]
+        compared = row_diff.columns["compared"]
+        old_rows = _cells(_rows_at(row_diff.dataset, pairs[:, 0]), 100)
+        new_rows = _cells(_rows_at(row_diff.other, pairs[:, 1]), 100)
+        for (old_position, new_position), mask, old_data, new_data in zip(pairs, changed, old_rows, new_rows):
+            changes.append({
+                "old_row_index": int(old_position),
+                "new_row_index": int(new_position),
+                "key": {col: new_data[col] for col in key_columns},
+                "changes": {
+                    col: {"old": old_data[col], "new": new_data[col]}
+                    for col, is_changed in zip(compared, mask) if is_changed
+                }
+            })
+
+    next_cursor = cursor + len(positions)
+    return {
+        "change": change,
+        "total": total,
+        "cursor": cursor,
+        "next_cursor": next_cursor if next_cursor < total else None,
+        "rows": changes
+    }
+
+
+def diff_to_dict(row_diff: models.RowDiff) -> dict:
+    """Сводка diff для API — без строк: они отдаются постранично"""
+
+    return {
+        "diff_id": row_diff.id,
+        "dataset_id": row_diff.dataset_id,
+        "other_id": row_diff.other_id,
+        "created_at": row_diff.created_at,
+        "key_columns": row_diff.key_columns,
+        "engine": row_diff.engine,
+        "old_rows": row_diff.old_rows,
+        "new_rows": row_diff.new_rows,
+        "inserted": row_diff.inserted,
+        "deleted": row_diff.deleted,
+        "updated": row_diff.updated,
+        "unchanged": row_diff.unchanged,
+        "columns": row_diff.columns,
+        "column_changes": row_diff.column_changes,
+        "duplicate_keys": row_diff.duplicate_keys
+    }
@@ -0,0 +1,320 @@
+import os
+import shutil
+import tempfile
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from .fingerprint import column_hash, combine_hashes, FINGERPRINT_MEMORY_ROWS, SPILL_PARTITION_BITS
+
+DIFF_CHANGES = ("inserted", "deleted", "updated")
+
+# Запись (хеш ключа, позиция строки, хеш значений) — 24 байта, поэтому порог втрое меньше, чем у хешей строк
+DIFF_MEMORY_ROWS = FINGERPRINT_MEMORY_ROWS // 3
+
+
+class KeyedRows:
+    """Хеши ключей и значений строк одной версии по потоку чанков
+
+    Записи копятся в памяти до memory_rows; дальше раскладываются по
+    2^SPILL_PARTITION_BITS временным файлам по старшим битам хеша ключа —
+    все строки с одним ключом (и из обеих версий) попадают в файл с тем же
+    номером, поэтому версии можно соединять по файлу за раз.
+    """
+
+    _RECORD = np.dtype([("key", np.uint64), ("position", np.int64), ("value", np.uint64)])
+
+    def __init__(self, memory_rows: int = DIFF_MEMORY_ROWS):
+        self.memory_rows = memory_rows
+        self.total = 0
+        self._pending = []
+        self._pending_size = 0
+        self._spill_dir = None
+
+    @property
+    def spilled(self) -> bool:
+        return self._spill_dir is not None
+
+    def add(self, keys: np.ndarray, positions: np.ndarray, values: np.ndarray) -> None:
+        records = np.empty(len(keys), dtype=self._RECORD)
+        records["key"] = keys
+        records["position"] = positions
+        records["value"] = values
+        self._pending.append(records)
+        self._pending_size += len(records)
+        self.total += len(records)
+        if self._pending_size > self.memory_rows:
+            self.spill()
+
+    def spill(self) -> None:
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="diff-")
+        if not self._pending:
+            return
+
+        records = np.concatenate(self._pending)
+        self._pending = []
+        self._pending_size = 0
+
+        partition = (records["key"] >> np.uint64(64 - SPILL_PARTITION_BITS)).astype(np.intp)
+        order = np.argsort(partition, kind="stable")
+        records, partition = records[order], partition[order]
+        bounds = np.searchsorted(partition, np.arange((1 << SPILL_PARTITION_BITS) + 1))
+        for part in range(1 << SPILL_PARTITION_BITS):
+            lo, hi = bounds[part], bounds[part + 1]
+            if hi > lo:
+                with open(os.path.join(self._spill_dir, f"{part}.rows"), "ab") as out:
+                    records[lo:hi].tofile(out)
+
+    def records(self) -> np.ndarray:
+        """Все записи (если ничего не выгружено на диск)"""
+        if not self._pending:
+            return np.empty(0, dtype=self._RECORD)
+        return np.concatenate(self._pending)
+
+    def partition(self, part: int) -> np.ndarray:
+        path = os.path.join(self._spill_dir, f"{part}.rows")
+        if not os.path.exists(path):
+            return np.empty(0, dtype=self._RECORD)
+        return np.fromfile(path, dtype=self._RECORD)
+
+    def discard(self) -> None:
+        """Бросаем накопленное (проход начинается заново или закончен)"""
+        self._pending = []
+        self._pending_size = 0
+        self.total = 0
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+
+
+def _hash_columns(chunk: pd.DataFrame, columns: list) -> np.ndarray:
+    hashes = np.zeros(len(chunk), dtype=np.uint64)
+    for col in columns:
+        combine_hashes(hashes, column_hash(chunk[col]))
+    return hashes
+
+
+def _columns(read_chunks: Callable) -> list:
+    """Колонки версии по первому чанку"""
+    chunks = read_chunks([])
+    try:
+        first = next(iter(chunks), None)
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+    return list(first.columns) if first is not None else []
+
+
+def _hash_pass(chunks, key_columns: list, value_columns: list, rows: KeyedRows) -> dict:
+    """Проход по чанкам одной версии: хеш ключа и хеш сравниваемых колонок каждой строки
+
+    Если колонка в одном чанке прочиталась как число, а в другом как текст,
+    проход прерывается и возвращает её в "retype" — хеши числа и текста не совпадают.
+    """
+
+    state = {"total": 0, "dtypes": {}, "retype": []}
+    dtypes = state["dtypes"]
+    rows.discard()
+
+    for chunk in chunks:
+        for col in chunk.columns:
+            is_text = not pd.api.types.is_numeric_dtype(chunk[col]) or pd.api.types.is_bool_dtype(chunk[col])
+            seen = dtypes.setdefault(col, is_text)
+            if seen != is_text:
+                state["retype"].append(col)
+        if state["retype"]:
+            rows.discard()
+            return state
+
+        offset = state["total"]
+        rows.add(
+            _hash_columns(chunk, key_columns),
+            np.arange(offset, offset + len(chunk), dtype=np.int64),
+            _hash_columns(chunk, value_columns)
+        )
+        state["total"] += len(chunk)
+
+    return state
+
+
+def _read_version(read_chunks: Callable, key_columns: list, value_columns: list, rows: KeyedRows) -> tuple:
+    """Хеши версии с повтором прохода, если тип колонки расходится по чанкам; (state, text_columns)"""
+
+    text_columns = []
+    while True:
+        state = _hash_pass(read_chunks(text_columns), key_columns, value_columns, rows)
+        if not state["retype"]:
+            return state, text_columns
+        text_columns += state["retype"]
+
+
+def _occurrences(keys: np.ndarray) -> np.ndarray:
+    """Номер вхождения ключа среди строк с тем же ключом (в порядке строк) — для повторяющихся ключей"""
+
+    order = np.argsort(keys, kind="stable")
+    ordered = keys[order]
+    starts = np.empty(len(keys), dtype=bool)
+    starts[:1] = True
+    np.not_equal(ordered[1:], ordered[:-1], out=starts[1:])
+    index = np.arange(len(keys))
+    occurrence = np.empty(len(keys), dtype=np.int64)
+    occurrence[order] = index - np.maximum.accumulate(np.where(starts, index, 0))
+    return occurrence
+
+
+def _join(old: np.ndarray, new: np.ndarray) -> dict:
+    """Hash join двух наборов записей по ключу
+
+    Строки с повторяющимся ключом сопоставляются по номеру вхождения:
+    первая с первой, вторая со второй. Сопоставленные строки с разным
+    хешем значений — изменённые.
+    """
+
+    old = old[np.argsort(old["position"], kind="stable")]
+    new = new[np.argsort(new["position"], kind="stable")]
+    old_occurrence, new_occurrence = _occurrences(old["key"]), _occurrences(new["key"])
+    # Ключ соединения — хеш ключа вместе с номером вхождения
+    old_join = combine_hashes(old["key"].copy(), pd.util.hash_array(old_occurrence))
+    new_join = combine_hashes(new["key"].copy(), pd.util.hash_array(new_occurrence))
+
+    _, old_index, new_index = np.intersect1d(old_join, new_join, assume_unique=True, return_indices=True)
+    matched_old = np.zeros(len(old), dtype=bool)
+    matched_old[old_index] = True
+    matched_new = np.zeros(len(new), dtype=bool)
+    matched_new[new_index] = True
+    changed = old["value"][old_index] != new["value"][new_index]
+
+    return {
+        "inserted": new["position"][~matched_new],
+        "deleted": old["position"][~matched_old],
+        "updated": np.column_stack([old["position"][old_index[changed]], new["position"][new_index[changed]]]),
+        "unchanged": int(len(changed) - changed.sum()),
+        "duplicate_keys": (int(np.count_nonzero(old_occurrence)), int(np.count_nonzero(new_occurrence)))
+    }
+
+
+def _join_versions(old: KeyedRows, new: KeyedRows) -> dict:
+    """Соединяем версии целиком в памяти или, если что-то выгружено на диск, по файлу за раз"""
+
+    if not old.spilled and not new.spilled:
+        parts = [_join(old.records(), new.records())]
+    else:
+        old.spill()
+        new.spill()
+        parts = [_join(old.partition(p), new.partition(p)) for p in range(1 << SPILL_PARTITION_BITS)]
+
+    updated = np.concatenate([part["updated"] for part in parts]).reshape(-1, 2)
+    return {
+        "inserted": np.sort(np.concatenate([part["inserted"] for part in parts])),
+        "deleted": np.sort(np.concatenate([part["deleted"] for part in parts])),
+        "updated": updated[np.argsort(updated[:, 1], kind="stable")],
+        "unchanged": sum(part["unchanged"] for part in parts),
+        "duplicate_keys": {
+            "old": sum(part["duplicate_keys"][0] for part in parts),
+            "new": sum(part["duplicate_keys"][1] for part in parts)
+        }
+    }
+
+
+def _gather_hashes(chunks, positions: np.ndarray, columns: list, out: np.ndarray) -> None:
+    """Хеши колонок строк по позициям: out[i, j] — хеш columns[j] в строке positions[i]
+
+    Чанки читаются по порядку и только до последней нужной строки.
+    """
+
+    if len(positions) == 0:
+        return
+    order = np.argsort(positions, kind="stable")
+    ordered = positions[order]
+    offset = 0
+    for chunk in chunks:
+        lo, hi = np.searchsorted(ordered, [offset, offset + len(chunk)])
+        if hi > lo:
+            rows = chunk.iloc[ordered[lo:hi] - offset]
+            for j, col in enumerate(columns):
+                out[order[lo:hi], j] = column_hash(rows[col])
+        offset += len(chunk)
+        if offset > ordered[-1]:
+            break
+
+
+def diff_versions(
+    read_old: Callable,
+    read_new: Callable,
+    key_columns: list,
+    spill_dir: str,
+    memory_rows: int = DIFF_MEMORY_ROWS
+) -> dict:
+    """Построчный diff двух версий по ключевым колонкам
+
+    read_old(text_columns) / read_new(text_columns) при каждом вызове
+    возвращают новый итератор по чанкам (для версии в памяти — один чанк
+    со всем DataFrame). Первый проход по каждой версии считает хеш ключа и
+    хеш остальных общих колонок строки (hash join, с выгрузкой на диск,
+    если строк больше memory_rows). Второй проход — только по изменённым
+    строкам: хеши каждой колонки, чтобы посчитать изменения по колонкам.
+
+    Возвращает сводку и массивы позиций: inserted (в новой версии),
+    deleted (в старой), updated (пары [старая, новая], по новой позиции) и
+    changed — матрица (изменённые строки × compared_columns) в spill_dir
+    (memmap .npy).
+    """
+
+    old_columns, new_columns = _columns(read_old), _columns(read_new)
+    missing = [col for col in key_columns if col not in old_columns or col not in new_columns]
+    if missing:
+        raise ValueError(f"Key column(s) not found in both versions: {', '.join(map(str, missing))}")
+    compared = [col for col in old_columns if col in new_columns and col not in key_columns]
+
+    old_rows, new_rows = KeyedRows(memory_rows), KeyedRows(memory_rows)
+    try:
+        old_state, old_text = _read_version(read_old, key_columns, compared, old_rows)
+        new_state, new_text = _read_version(read_new, key_columns, compared, new_rows)
+        joined = _join_versions(old_rows, new_rows)
+    finally:
+        old_rows.discard()
+        new_rows.discard()
+
+    updated = joined["updated"]
+    changed = np.lib.format.open_memmap(
+        os.path.join(spill_dir, "changed.npy"), mode="w+", dtype=bool, shape=(len(updated), len(compared))
+    )
+    if len(updated) and compared:
+        old_hashes = np.lib.format.open_memmap(
+            os.path.join(spill_dir, "old-hashes.npy"), mode="w+", dtype=np.uint64, shape=changed.shape
+        )
+        new_hashes = np.lib.format.open_memmap(
+            os.path.join(spill_dir, "new-hashes.npy"), mode="w+", dtype=np.uint64, shape=changed.shape
+        )
+        _gather_hashes(read_old(old_text), updated[:, 0], compared, old_hashes)
+        _gather_hashes(read_new(new_text), updated[:, 1], compared, new_hashes)
+        for j in range(len(compared)):
+            changed[:, j] = old_hashes[:, j] != new_hashes[:, j]
+        del old_hashes, new_hashes
+        os.remove(os.path.join(spill_dir, "old-hashes.npy"))
+        os.remove(os.path.join(spill_dir, "new-hashes.npy"))
+    changed.flush()
+
+    old_text_like = {col for col, is_text in old_state["dtypes"].items() if is_text}
+    new_text_like = {col for col, is_text in new_state["dtypes"].items() if is_text}
+    return {
+        "key_columns": list(key_columns),
+        "compared_columns": compared,
+        "added_columns": [col for col in new_columns if col not in old_columns],
+        "removed_columns": [col for col in old_columns if col not in new_columns],
+        # Число в одной версии и текст в другой: хеши не совпадут ни у одного значения колонки
+        "retyped_columns": [
+            col for col in list(key_columns) + compared if (col in old_text_like) != (col in new_text_like)
+        ],
+        "old_rows": old_state["total"],
+        "new_rows": new_state["total"],
+        "unchanged": joined["unchanged"],
+        "duplicate_keys": joined["duplicate_keys"],
+        "column_changes": {col: int(changed[:, j].sum()) for j, col in enumerate(compared)},
+        "inserted": joined["inserted"],
+        "deleted": joined["deleted"],
+        "updated": updated,
+        "changed": changed
+    }
@@ -0,0 +1,204 @@
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+# Перцентили, которыми хранится распределение числовой колонки — гистограмма
+# равной частоты; по ней считаются и PSI, и KS
+DRIFT_QUANTILES = np.linspace(0, 1, 101)
+
+# Сколько самых частых значений текстовой колонки хранится; остальные — одной корзиной "other"
+DRIFT_TOP_VALUES = 50
+
+# Корзины PSI — децили опорной (старой) версии
+PSI_BINS = 10
+
+# Пороги "умеренный" / "сильный" сдвиг: PSI, статистика KS (ловит изменение формы при
+# том же PSI), для категорий — расстояние Дженсена-Шеннона
+PSI_THRESHOLDS = (0.1, 0.25)
+KS_THRESHOLDS = (0.05, 0.1)
+JS_THRESHOLDS = (0.1, 0.2)
+
+DRIFT_STATUSES = np.array(["stable", "moderate_shift", "significant_shift"])
+
+# Сдвиг засчитывается, только если тест (KS / хи-квадрат) значим
+DRIFT_P_VALUE = 0.05
+
+# Доля пустой корзины в PSI — чтобы не делить на ноль
+_PSI_EPS = 1e-4
+
+
+def quantile_sketch(ordered: np.ndarray) -> Optional[list]:
+    """Перцентили отсортированных значений колонки без пропусков"""
+    if len(ordered) == 0:
+        return None
+    return sorted_quantiles(ordered[:, None], [len(ordered)])[0].tolist()
+
+
+def sorted_quantiles(ordered: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Перцентили всех колонок уже отсортированного 2D-блока (NaN — в конце колонки)
+
+    Тот же линейный метод, что у np.quantile, но без повторной сортировки:
+    позиции считаются сразу для всех колонок. Колонки без значений — NaN.
+    """
+
+    counts = np.asarray(counts)
+    if len(ordered) == 0:
+        return np.full((ordered.shape[1], len(DRIFT_QUANTILES)), np.nan)
+    position = DRIFT_QUANTILES[:, None] * np.maximum(counts - 1, 0)[None, :]
+    lower = np.floor(position).astype(np.intp)
+    upper = np.minimum(lower + 1, np.maximum(counts - 1, 0)[None, :])
+    fraction = position - lower
+    low_values = np.take_along_axis(ordered, lower, axis=0)
+    high_values = np.take_along_axis(ordered, upper, axis=0)
+    quantiles = low_values + (high_values - low_values) * fraction
+    quantiles[:, counts == 0] = np.nan
+    return quantiles.T
+
+
+def value_counts_sketch(counts: np.ndarray, uniques) -> dict:
+    """Самые частые значения (ключи — текст, как в JSON) и сумма остальных; нулевые счётчики отбрасываются"""
+
+    present = np.flatnonzero(counts)
+    counts, uniques = counts[present], [uniques[i] for i in present]
+    if len(counts) > DRIFT_TOP_VALUES:
+        top = np.argpartition(counts, -DRIFT_TOP_VALUES)[-DRIFT_TOP_VALUES:]
+    else:
+        top = np.arange(len(counts))
+    top = top[np.argsort(-counts[top], kind="stable")]
+    values = {str(uniques[i]): int(counts[i]) for i in top}
+    return {"values": values, "other": int(counts.sum() - sum(values.values()))}
+
+
+def _cdf(quantiles: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """Кусочно-линейная функция распределения по перцентилям, для всех колонок сразу
+
+    quantiles — (колонки × перцентили), points — (колонки × точки). Функция
+    непрерывна справа: в точке, где перцентили совпадают (частое значение),
+    берётся верхняя вероятность.
+    """
+
+    above = (quantiles[:, None, :] <= points[:, :, None]).sum(axis=2)
+    upper = np.clip(above, 1, quantiles.shape[1] - 1)
+    q_lo = np.take_along_axis(quantiles, upper - 1, axis=1)
+    q_hi = np.take_along_axis(quantiles, upper, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = np.where(q_hi > q_lo, (points - q_lo) / (q_hi - q_lo), 1.0)
+    cdf = DRIFT_QUANTILES[upper - 1] + np.clip(fraction, 0, 1) * (DRIFT_QUANTILES[upper] - DRIFT_QUANTILES[upper - 1])
+    cdf[above == 0] = 0.0
+    cdf[above == quantiles.shape[1]] = 1.0
+    return cdf
+
+
+def numeric_drift(old: np.ndarray, new: np.ndarray, old_counts: np.ndarray, new_counts: np.ndarray) -> dict:
+    """PSI и двухвыборочный KS по перцентилям (колонки × перцентили) двух версий
+
+    KS — максимум расхождения функций распределения по всем перцентилям
+    обеих версий, p-value — асимптотическое (распределение Колмогорова) с
+    эффективным размером n·m/(n+m). PSI — по децилям старой версии.
+    Статус — худший из уровней по PSI и KS, если KS значим.
+    """
+
+    points = np.concatenate([old, new], axis=1)
+    ks = np.abs(_cdf(old, points) - _cdf(new, points)).max(axis=1)
+    effective = old_counts * new_counts / np.maximum(old_counts + new_counts, 1)
+    ks_p_value = stats.kstwobign.sf(ks * np.sqrt(effective))
+
+    step = (len(DRIFT_QUANTILES) - 1) // PSI_BINS
+    edges = old[:, step:-1:step]
+    expected = np.diff(_cdf(old, edges), prepend=0, append=1, axis=1)
+    actual = np.diff(_cdf(new, edges), prepend=0, append=1, axis=1)
+    expected = np.maximum(expected, _PSI_EPS)
+    actual = np.maximum(actual, _PSI_EPS)
+    psi = ((actual - expected) * np.log(actual / expected)).sum(axis=1)
+
+    level = np.maximum(np.searchsorted(PSI_THRESHOLDS, psi, side="right"),
+                       np.searchsorted(KS_THRESHOLDS, ks, side="right"))
+    status = DRIFT_STATUSES[np.where(ks_p_value < DRIFT_P_VALUE, level, 0)]
+    return {"psi": psi, "ks_statistic": ks, "ks_p_value": ks_p_value, "distribution_status": status}
+
+
+def _contingency(old: list, new: list) -> np.ndarray:
+    """Счётчики двух версий по общему списку значений: (колонки × 2 × значения), с корзиной other"""
+
+    aligned = []
+    for old_counts, new_counts in zip(old, new):
+        keys = list(dict.fromkeys([*old_counts["values"], *new_counts["values"]]))
+        aligned.append((
+            [old_counts["values"].get(k, 0) for k in keys] + [old_counts["other"]],
+            [new_counts["values"].get(k, 0) for k in keys] + [new_counts["other"]]
+        ))
+    width = max((len(a) for a, _ in aligned), default=0)
+    table = np.zeros((len(aligned), 2, width), dtype=np.float64)
+    for i, (a, b) in enumerate(aligned):
+        table[i, 0, :len(a)] = a
+        table[i, 1, :len(b)] = b
+    return table
+
+
+def categorical_drift(old: list, new: list) -> dict:
+    """Хи-квадрат однородности и расстояние Дженсена-Шеннона по частым значениям двух версий
+
+    Значения, попавшие в сводку только одной версии, у другой считаются
+    нулём (их настоящий счётчик остался в её other) — при числе значений
+    больше DRIFT_TOP_VALUES результат приблизительный.
+    """
+
+    table = _contingency(old, new)
+    totals = table.sum(axis=2, keepdims=True)
+    categories = table.sum(axis=1, keepdims=True)
+    grand = np.maximum(totals.sum(axis=1, keepdims=True), 1)
+    expected = totals * categories / grand
+    with np.errstate(divide="ignore", invalid="ignore"):
+        chi2 = np.where(expected > 0, (table - expected) ** 2 / expected, 0).sum(axis=(1, 2))
+        dof = np.maximum((categories[:, 0, :] > 0).sum(axis=1) - 1, 0)
+        chi2_p_value = np.where(dof > 0, stats.chi2.sf(chi2, np.maximum(dof, 1)), 1.0)
+
+        shares = table / np.maximum(totals, 1)
+        middle = shares.mean(axis=1, keepdims=True)
+        terms = np.where(shares > 0, shares * np.log2(shares / middle), 0)
+    js_distance = np.sqrt(np.maximum(terms.sum(axis=2).mean(axis=1), 0))
+
+    level = np.searchsorted(JS_THRESHOLDS, js_distance, side="right")
+    status = DRIFT_STATUSES[np.where(chi2_p_value < DRIFT_P_VALUE, level, 0)]
+    return {"chi2": chi2, "chi2_p_value": chi2_p_value, "js_distance": js_distance, "distribution_status": status}
+
+
+def distribution_drift(old: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """Тесты дрейфа для общих колонок двух таблиц column_stats / profile_stats
+
+    Числовые колонки (перцентили есть в обеих версиях) проверяются пачкой
+    через numeric_drift, текстовые (есть счётчики значений) — через
+    categorical_drift. Для остальных колонок в результате NaN/None.
+    """
+
+    drift = pd.DataFrame(index=range(len(old)), columns=[
+        "psi", "ks_statistic", "ks_p_value", "chi2", "chi2_p_value", "js_distance", "distribution_status"
+    ], dtype=object)
+
+    numeric = np.flatnonzero([
+        a is not None and b is not None for a, b in zip(old["quantiles"], new["quantiles"])
+    ])
+    if len(numeric):
+        result = numeric_drift(
+            np.array([old["quantiles"].iloc[i] for i in numeric], dtype=np.float64),
+            np.array([new["quantiles"].iloc[i] for i in numeric], dtype=np.float64),
+            (old["rows"] - old["missing"]).to_numpy()[numeric].astype(np.float64),
+            (new["rows"] - new["missing"]).to_numpy()[numeric].astype(np.float64)
+        )
+        for name, values in result.items():
+            drift.loc[numeric, name] = list(values)
+
+    categorical = np.flatnonzero([
+        a is not None and b is not None for a, b in zip(old["value_counts"], new["value_counts"])
+    ])
+    if len(categorical):
+        result = categorical_drift(
+            [old["value_counts"].iloc[i] for i in categorical],
+            [new["value_counts"].iloc[i] for i in categorical]
+        )
+        for name, values in result.items():
+            drift.loc[categorical, name] = list(values)
+
+    return drift
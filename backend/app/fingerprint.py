@@ -0,0 +1,261 @@
+import os
+import shutil
+import tempfile
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .sketches import HyperLogLog
+
+# Сколько уникальных хешей строк держим в памяти, прежде чем сбросить их на диск (8 байт на строку)
+FINGERPRINT_MEMORY_ROWS = int(os.getenv("FINGERPRINT_MEMORY_ROWS", 10_000_000))
+
+# На сколько файлов делятся сброшенные хеши (по старшим битам); в памяти — один файл за раз
+SPILL_PARTITION_BITS = 6
+
+DUPLICATE_MODES = ("exact", "approx")
+
+# Хеш NULL — как у pd.util.hash_pandas_object
+NULL_HASH = np.uint64(np.iinfo(np.uint64).max)
+
+# Метка для хешей дробных чисел, чтобы они не совпадали с хешами целых
+_FLOAT_TAG = np.uint64(0x9E3779B97F4A7C15)
+
+
+def column_hash(series: pd.Series, factorized: Optional[tuple] = None) -> np.ndarray:
+    """64-битный хеш каждого значения колонки, не зависящий от чанка и соседних строк
+
+    Числа нормализуются: целые значения хешируются как int64 (5 и 5.0 совпадают,
+    большие id не теряют точность), -0.0 равен 0.0, все NaN равны между собой.
+    Остальные типы — через pd.util.hash_pandas_object. Если у вызывающего уже
+    есть pd.factorize(series), её можно передать в factorized — хешируются
+    только уникальные значения.
+    """
+
+    if factorized is not None:
+        codes, uniques = factorized
+        if len(uniques) == 0:
+            return np.full(len(codes), NULL_HASH)
+        hashed = pd.util.hash_array(np.asarray(uniques, dtype=object), categorize=False)
+        return np.where(codes < 0, NULL_HASH, hashed.take(codes, mode="clip"))
+
+    if pd.api.types.is_bool_dtype(series) or not pd.api.types.is_numeric_dtype(series):
+        return pd.util.hash_pandas_object(series, index=False).to_numpy()
+
+    values = series.to_numpy()
+    if values.dtype.kind in "iu":
+        return pd.util.hash_array(values.astype(np.int64, copy=False))
+
+    values = series.to_numpy(dtype=np.float64, na_value=np.nan) + 0.0
+    with np.errstate(invalid="ignore"):
+        integral = (values == np.trunc(values)) & (np.abs(values) < 2.0 ** 63)
+    # Колонка целиком из целых или целиком из дробных — хешируем один раз
+    if integral.all():
+        return pd.util.hash_array(values.astype(np.int64))
+    if not integral.any():
+        values[np.isnan(values)] = np.nan
+        return pd.util.hash_array(values) ^ _FLOAT_TAG
+    hashes = pd.util.hash_array(np.where(integral, values, 0).astype(np.int64))
+
+    fractional = ~integral
+    if fractional.any():
+        rest = values[fractional]
+        rest[np.isnan(rest)] = np.nan
+        hashes[fractional] = pd.util.hash_array(rest) ^ _FLOAT_TAG
+    return hashes
+
+
+def combine_hashes(row_hash: np.ndarray, col_hash: np.ndarray) -> np.ndarray:
+    """Добавляем хеш колонки к хешу строки (FNV-подобно: умножение и xor на uint64)"""
+    with np.errstate(over="ignore"):
+        row_hash *= np.uint64(0x100000001B3)
+        row_hash ^= col_hash
+    return row_hash
+
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """64-битный отпечаток каждой строки: одинаковые строки дают одинаковый хеш"""
+    hashes = np.zeros(len(df), dtype=np.uint64)
+    for i in range(df.shape[1]):
+        combine_hashes(hashes, column_hash(df.iloc[:, i]))
+    return hashes
+
+
+def count_duplicates(hashes: np.ndarray) -> int:
+    """Число повторов (как duplicated().sum()): сортируем хеши и сравниваем соседей"""
+    if len(hashes) < 2:
+        return 0
+    ordered = np.sort(hashes)
+    return int(np.count_nonzero(ordered[1:] == ordered[:-1]))
+
+
+def estimate_duplicates(hashes: np.ndarray) -> int:
+    """Оценка числа повторов через HyperLogLog: памяти 16 КБ, ошибка ~0.8% от числа уникальных"""
+    hll = HyperLogLog()
+    hll.add_hashes(hashes)
+    return max(len(hashes) - hll.estimate(), 0)
+
+
+class DuplicateCounter:
+    """Дубликаты строк по потоку хешей, пришедших чанками
+
+    approx — HyperLogLog, фиксированная память и ошибка ~0.8% от числа
+    уникальных строк. exact — хеши (уникальные в пределах чанка) копятся в
+    памяти до memory_rows; дальше они раскладываются по 2^SPILL_PARTITION_BITS
+    временным файлам по старшим битам, и в конце каждый файл считается
+    отдельно. Так точный подсчёт работает и для файлов больше памяти.
+    """
+
+    def __init__(self, mode: str = "exact", memory_rows: int = FINGERPRINT_MEMORY_ROWS):
+        if mode not in DUPLICATE_MODES:
+            raise ValueError(f"Unknown duplicates mode: {mode}")
+        self.mode = mode
+        self.memory_rows = memory_rows
+        self.total = 0
+        self._hll = HyperLogLog() if mode == "approx" else None
+        self._pending = []
+        self._pending_size = 0
+        self._spill_dir = None
+
+    @property
+    def approximate(self) -> bool:
+        return self.mode == "approx"
+
+    def add(self, hashes: np.ndarray) -> None:
+        self.total += len(hashes)
+        if self._hll is not None:
+            self._hll.add_hashes(hashes)
+            return
+
+        unique = np.unique(hashes)
+        self._pending.append(unique)
+        self._pending_size += len(unique)
+        if self._pending_size > self.memory_rows:
+            self._spill()
+
+    def _spill(self) -> None:
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="fingerprint-")
+        if not self._pending:
+            return
+
+        hashes = np.concatenate(self._pending)
+        self._pending = []
+        self._pending_size = 0
+
+        partition = (hashes >> np.uint64(64 - SPILL_PARTITION_BITS)).astype(np.intp)
+        order = np.argsort(partition, kind="stable")
+        hashes, partition = hashes[order], partition[order]
+        bounds = np.searchsorted(partition, np.arange((1 << SPILL_PARTITION_BITS) + 1))
+        for part in range(1 << SPILL_PARTITION_BITS):
+            lo, hi = bounds[part], bounds[part + 1]
+            if hi > lo:
+                with open(os.path.join(self._spill_dir, f"{part}.u64"), "ab") as out:
+                    hashes[lo:hi].tofile(out)
+
+    def distinct(self) -> int:
+        if self._hll is not None:
+            return min(self._hll.estimate(), self.total)
+
+        if self._spill_dir is None:
+            if not self._pending:
+                return 0
+            return len(np.unique(np.concatenate(self._pending)))
+
+        self._spill()
+        try:
+            distinct = 0
+            for name in os.listdir(self._spill_dir):
+                part = np.fromfile(os.path.join(self._spill_dir, name), dtype=np.uint64)
+                distinct += len(np.unique(part))
+            return distinct
+        finally:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+
+    def duplicates(self) -> int:
+        return self.total - self.distinct()
+
+
+class DuplicatePositions:
+    """Позиции всех повторяющихся значений (как duplicated(keep=False)) по потоку чанков
+
+    Пары (хеш, позиция строки) копятся в памяти до memory_rows; дальше
+    раскладываются по 2^SPILL_PARTITION_BITS временным файлам по старшим
+    битам хеша. Одинаковые хеши всегда попадают в один файл, поэтому каждый
+    файл сортируется и проверяется отдельно.
+    """
+
+    _PAIR = np.dtype([("hash", np.uint64), ("position", np.int64)])
+
+    # Пара занимает 16 байт — вдвое больше хеша, поэтому и порог вдвое меньше
+    def __init__(self, memory_rows: int = FINGERPRINT_MEMORY_ROWS // 2):
+        self.memory_rows = memory_rows
+        self._pending = []
+        self._pending_size = 0
+        self._spill_dir = None
+
+    def add(self, hashes: np.ndarray, positions: np.ndarray) -> None:
+        pairs = np.empty(len(hashes), dtype=self._PAIR)
+        pairs["hash"] = hashes
+        pairs["position"] = positions
+        self._pending.append(pairs)
+        self._pending_size += len(pairs)
+        if self._pending_size > self.memory_rows:
+            self._spill()
+
+    def _spill(self) -> None:
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="duplicates-")
+        if not self._pending:
+            return
+
+        pairs = np.concatenate(self._pending)
+        self._pending = []
+        self._pending_size = 0
+
+        partition = (pairs["hash"] >> np.uint64(64 - SPILL_PARTITION_BITS)).astype(np.intp)
+        order = np.argsort(partition, kind="stable")
+        pairs, partition = pairs[order], partition[order]
+        bounds = np.searchsorted(partition, np.arange((1 << SPILL_PARTITION_BITS) + 1))
+        for part in range(1 << SPILL_PARTITION_BITS):
+            lo, hi = bounds[part], bounds[part + 1]
+            if hi > lo:
+                with open(os.path.join(self._spill_dir, f"{part}.pairs"), "ab") as out:
+                    pairs[lo:hi].tofile(out)
+
+    @staticmethod
+    def _duplicated(pairs: np.ndarray) -> np.ndarray:
+        if len(pairs) < 2:
+            return np.empty(0, dtype=np.int64)
+        hashes = np.sort(pairs["hash"])
+        repeated = hashes[1:][hashes[1:] == hashes[:-1]]
+        return pairs["position"][np.isin(pairs["hash"], repeated)]
+
+    def positions(self) -> np.ndarray:
+        """Отсортированные позиции строк, значение которых встречается больше одного раза"""
+
+        if self._spill_dir is None:
+            if not self._pending:
+                return np.empty(0, dtype=np.int64)
+            return np.sort(self._duplicated(np.concatenate(self._pending)))
+
+        self._spill()
+        try:
+            found = [
+                self._duplicated(np.fromfile(os.path.join(self._spill_dir, name), dtype=self._PAIR))
+                for name in os.listdir(self._spill_dir)
+            ]
+            return np.sort(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+        finally:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+
+    def discard(self) -> None:
+        """Бросаем накопленное (проход начинается заново)"""
+        self._pending = []
+        self._pending_size = 0
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
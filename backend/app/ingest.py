@@ -0,0 +1,81 @@
+import os
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from fastapi import UploadFile
+
+from .security import MAX_FILE_SIZE, CsvStructureValidator, CsvContentScanner
+
+# Размер чанка при чтении загрузки — именно он ограничивает пиковую память
+CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+
+
+async def ingest_upload(file: UploadFile, dest_dir: Optional[Path] = None) -> dict:
+    """Потоково читаем загрузку: размер, SHA256, структура, сканер и запись на диск за один проход
+
+    Если dest_dir задан, содержимое пишется во временный файл в этой директории
+    (tmp_path в результате) — переименовать его в итоговое место должен вызывающий.
+    При превышении лимита размера чтение прерывается, а временный файл удаляется.
+    """
+
+    hasher = hashlib.sha256()
+    structure = CsvStructureValidator()
+    scanner = CsvContentScanner()
+    size = 0
+
+    out = None
+    tmp_path = None
+    if dest_dir is not None:
+        fd, tmp_name = tempfile.mkstemp(dir=dest_dir, suffix=".part")
+        out = os.fdopen(fd, "wb")
+        tmp_path = Path(tmp_name)
+
+    try:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+
+            size += len(chunk)
+            if size > MAX_FILE_SIZE:
+                if out is not None:
+                    out.close()
+                    out = None
+                    tmp_path.unlink(missing_ok=True)
+                    tmp_path = None
+                return {
+                    "size": size,
+                    "size_ok": False,
+                    "tmp_path": None,
+                    "file_hash": None,
+                    "structure": None,
+                    "scan": None
+                }
+
+            hasher.update(chunk)
+            structure.feed(chunk)
+            # Файл с битой структурой всё равно отклоняется — сканировать его незачем
+            if not structure.failed:
+                scanner.feed(chunk)
+            if out is not None:
+                out.write(chunk)
+    except BaseException:
+        if out is not None:
+            out.close()
+            out = None
+            tmp_path.unlink(missing_ok=True)
+        raise
+    finally:
+        if out is not None:
+            out.close()
+
+    return {
+        "size": size,
+        "size_ok": True,
+        "tmp_path": tmp_path,
+        "file_hash": hasher.hexdigest(),
+        "structure": structure.result(),
+        "scan": None if structure.failed else scanner.result()
+    }
@@ -0,0 +1,308 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+from .storage import load_dataframe, iter_chunks, read_csv, cache_token
+from .model_registry import load_model, register_model, find_model
+from .profiler import (
+    profile_dataset, profile_chunked, detect_anomalies_with_model, calculate_quality_score, detect_issues
+)
+
+# Сколько профилирований одновременно выполняется в фоне
+PROFILE_WORKERS = int(os.getenv("PROFILE_WORKERS", 2))
+
+# engine=auto: датасеты, которые в памяти займут больше, профилируются потоково, по чанкам
+PROFILE_IN_MEMORY_MB = int(os.getenv("PROFILE_IN_MEMORY_MB", 512))
+
+# По скольким первым строкам оценивается размер строки DataFrame в памяти
+PROFILE_SAMPLE_ROWS = int(os.getenv("PROFILE_SAMPLE_ROWS", 10_000))
+
+# Строк в одном чанке потокового профилирования
+PROFILE_CHUNK_ROWS = int(os.getenv("PROFILE_CHUNK_ROWS", 200_000))
+
+PROFILE_ENGINES = ("auto", "memory", "chunked")
+
+# Потоков для разметки строк IsolationForest (-1 — все ядра)
+ANOMALY_JOBS = int(os.getenv("ANOMALY_JOBS", -1))
+
+_executor = None
+_row_bytes = {}  # cache_token -> байт на строку DataFrame
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Пул процессов создаётся лениво; spawn — чтобы дочерние процессы не наследовали соединения БД"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=PROFILE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+def find_cached_profile(db: Session, dataset: models.Dataset, duplicates: str = "exact"):
+    """Последний профиль любого датасета с тем же content_hash
+
+    Для duplicates=exact приближённый подсчёт дубликатов не подходит.
+    """
+
+    if not dataset.content_hash:
+        return None
+
+    profiles = db.query(models.QualityProfile) \
+        .join(models.Dataset, models.QualityProfile.dataset_id == models.Dataset.id) \
+        .filter(models.Dataset.content_hash == dataset.content_hash) \
+        .order_by(models.QualityProfile.created_at.desc())
+
+    for cached in profiles:
+        approximate = cached.metrics["profile"].get("approximate", {})
+        if duplicates == "approx" or not approximate.get("duplicates"):
+            return cached
+    return None
+
+
+def estimate_memory(dataset: models.Dataset) -> int:
+    """Оценка размера DataFrame в памяти, байт
+
+    Размер файла тут не годится: текстовые колонки в pandas занимают в
+    разы больше, чем в CSV. Берём размер строки по первым
+    PROFILE_SAMPLE_ROWS строкам (memory_usage(deep=True)) и умножаем на
+    число строк; размер строки запоминается по содержимому файла.
+    """
+
+    token = cache_token(dataset)
+    per_row = _row_bytes.get(token)
+    if per_row is None:
+        sample = read_csv(dataset, nrows=PROFILE_SAMPLE_ROWS)
+        per_row = sample.memory_usage(deep=True, index=False).sum() / max(len(sample), 1)
+        if token:
+            _row_bytes[token] = per_row
+    return int(per_row * (dataset.total_rows or 0))
+
+
+def resolve_engine(dataset: models.Dataset, engine: str) -> str:
+    """memory — весь DataFrame в памяти, chunked — потоково со скетчами; auto выбирает по оценке памяти"""
+
+    if engine != "auto":
+        return engine
+    try:
+        size = estimate_memory(dataset)
+    except Exception:
+        return "memory"
+    return "chunked" if size > PROFILE_IN_MEMORY_MB * 1024 * 1024 else "memory"
+
+
+def run_profile(
+    db: Session,
+    dataset: models.Dataset,
+    refresh: bool = False,
+    engine: str = "auto",
+    duplicates: str = "exact",
+    anomalies_mode: str = "auto",
+    progress: Optional[Callable[[int], None]] = None
+) -> dict:
+    """Профилирование датасета с сохранением QualityProfile и проблем в БД
+
+    Общий код для синхронного запроса и фоновой задачи; progress(pct)
+    вызывается после каждого крупного шага. Модель аномалий берётся из
+    реестра (корень цепочки версий + набор числовых колонок) и обучается
+    только для первой версии с таким набором; refresh её не переобучает —
+    для этого модель удаляют из реестра.
+    """
+
+    report = progress or (lambda pct: None)
+
+    # Профиль того же содержимого уже посчитан — переиспользуем его
+    cached = None if refresh else find_cached_profile(db, dataset, duplicates)
+    if cached:
+        profile = cached.metrics["profile"]
+        anomalies = cached.metrics["anomalies"]
+        quality_score = cached.quality_score
+        issues = detect_issues(profile, anomalies)
+    else:
+        def model_lookup(columns: list) -> Optional[dict]:
+            return load_model(db, dataset, columns)
+
+        if resolve_engine(dataset, engine) == "chunked":
+            # Потоково: два прохода по чанкам, в памяти только аккумуляторы
+            profile, anomalies, model = profile_chunked(
+                lambda text_columns: iter_chunks(dataset, PROFILE_CHUNK_ROWS, text_columns),
+                duplicates=duplicates,
+                model_lookup=model_lookup,
+                n_jobs=ANOMALY_JOBS
+            )
+            report(80)
+        else:
+            # Читаем данные
+            df = load_dataframe(dataset)
+            report(10)
+
+            # Анализируем
+            profile = profile_dataset(df, duplicates=duplicates)
+            report(40)
+            numeric_columns = list(df.select_dtypes(include='number').columns)
+            anomalies, model = detect_anomalies_with_model(
+                df, mode=anomalies_mode, model=model_lookup(numeric_columns), n_jobs=ANOMALY_JOBS
+            )
+            report(80)
+
+        # Новую модель кладём в реестр; id модели — в результат
+        if model is not None:
+            if anomalies["model_reused"]:
+                entry = find_model(db, dataset, model["columns"])
+            else:
+                entry = register_model(db, dataset, model)
+            anomalies["model_id"] = entry.id if entry else None
+
+        quality_score = calculate_quality_score(profile, anomalies)
+        issues = detect_issues(profile, anomalies)
+
+    # Сохраняем профиль в БД
+    db_profile = models.QualityProfile(
+        dataset_id=dataset.id,
+        metrics={
+            "profile": profile,
+            "anomalies": anomalies
+        },
+        quality_score=quality_score
+    )
+    db.add(db_profile)
+
+    # Сохраняем проблемы в БД
+    for issue in issues:
+        db_issue = models.QualityIssue(
+            dataset_id=dataset.id,
+            **issue
+        )
+        db.add(db_issue)
+
+    db.commit()
+    db.refresh(db_profile)
+    report(95)
+
+    return {
+        "dataset_id": dataset.id,
+        "profile_id": db_profile.id,
+        "quality_score": quality_score,
+        "profile": profile,
+        "anomalies": anomalies,
+        "issues": issues
+    }
+
+
+def submit_profile_job(db: Session, dataset: models.Dataset, options: dict) -> models.Job:
+    """Ставим профилирование в очередь и сразу возвращаем запись задачи"""
+
+    job = models.Job(
+        dataset_id=dataset.id,
+        kind="profile",
+        status="queued",
+        progress=0,
+        options=options
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    get_executor().submit(run_profile_job, job.id)
+    return job
+
+
+def fail_stale_jobs() -> int:
+    """При старте: задачи queued/running остались от прошлого процесса — пул с ними пропал
+
+    Помечаем их failed, иначе клиенты, опрашивающие /jobs/{id}, ждали бы вечно.
+    Возвращает число таких задач.
+    """
+
+    db = SessionLocal()
+    try:
+        stale = db.query(models.Job).filter(models.Job.status.in_(("queued", "running"))).all()
+        for job in stale:
+            job.status = "failed"
+            job.error = "Interrupted by a server restart; submit the job again"
+            job.finished_at = datetime.utcnow()
+        db.commit()
+        return len(stale)
+    finally:
+        db.close()
+
+
+def run_profile_job(job_id: int) -> None:
+    """Выполняется в процессе пула: своя сессия БД, статус и прогресс пишутся в jobs"""
+
+    db = SessionLocal()
+    try:
+        job = db.query(models.Job).filter(models.Job.id == job_id).first()
+        if not job:
+            return
+
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        db.commit()
+
+        def progress(pct: int) -> None:
+            job.progress = pct
+            db.commit()
+
+        try:
+            dataset = db.query(models.Dataset) \
+                .filter(models.Dataset.id == job.dataset_id).first()
+            if not dataset:
+                raise ValueError(f"Dataset {job.dataset_id} not found")
+
+            options = job.options or {}
+            result = run_profile(
+                db, dataset,
+                refresh=options.get("refresh", False),
+                engine=options.get("engine", "auto"),
+                duplicates=options.get("duplicates", "exact"),
+                anomalies_mode=options.get("anomalies", "auto"),
+                progress=progress
+            )
+
+            job.status = "done"
+            job.progress = 100
+            job.profile_id = result["profile_id"]
+        except Exception as e:
+            db.rollback()
+            job.status = "failed"
+            job.error = str(e)[:500]
+
+        job.finished_at = datetime.utcnow()
+        db.commit()
+    finally:
+        db.close()
+
+
+def job_to_dict(job: models.Job) -> dict:
+    """Представление задачи для API"""
+
+    queued_seconds = None
+    run_seconds = None
+    if job.started_at:
+        queued_seconds = round((job.started_at - job.created_at).total_seconds(), 3)
+    if job.started_at and job.finished_at:
+        run_seconds = round((job.finished_at - job.started_at).total_seconds(), 3)
+
+    return {
+        "job_id": job.id,
+        "dataset_id": job.dataset_id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "options": job.options,
+        "error": job.error,
+        "profile_id": job.profile_id,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "queued_seconds": queued_seconds,
+        "run_seconds": run_seconds
+    }
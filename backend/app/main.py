@@ -1,31 +1,47 @@
-from fastapi import FastAPI, UploadFile, File, Depends, HTTPException
+from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, BackgroundTasks, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
 import shutil
+import json
 import os
-import pandas as pd
-from pathlib import Path
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from fastapi import Request
-from .security import (
-    validate_file_extension, validate_file_size,
-    sanitize_filename, scan_csv_content,
-    compute_file_hash, validate_csv_structure
+from .security import validate_file_extension, sanitize_filename
+from .ingest import ingest_upload
+from .cache import dataframe_cache
+from .storage import (
+    UPLOAD_DIR, store_blob, find_by_hash, release_file,
+    ensure_columnar, load_dataframe, dataset_columns
 )
 from starlette.middleware.base import BaseHTTPMiddleware
 
 MAX_FILE_SIZE_MB = 100
 
 from . import models, schemas
-from .database import engine, get_db
-from .profiler import profile_dataset, detect_anomalies, calculate_quality_score, detect_issues
+from .database import engine, get_db, upgrade_schema
+from .jobs import run_profile, submit_profile_job, fail_stale_jobs, job_to_dict, PROFILE_ENGINES
 from .ai_agent import analyze_quality, suggest_rules, explain_issue
-from .comparator import compare_versions, calculate_drift_score
+from .comparator import compare_stats, calculate_drift_score, COMPARE_SOURCES
+from .fingerprint import DUPLICATE_MODES
+from .profiler import ANOMALY_MODES
+from .model_registry import root_id_of, delete_model, model_to_dict
+from .validator import VIOLATION_SAMPLE_SIZE, MAX_VIOLATION_SAMPLE_SIZE, SAMPLING_MODES, rule_problem
+from .validation_runs import (
+    run_validation, latest_run, run_to_dict, run_lines, delete_runs, find_run, find_result, violations_page
+)
+from .differ import DIFF_CHANGES
+from .diff_runs import run_diff, find_diff, diff_available, diff_page, diff_to_dict, delete_diffs
+from .timeline import version_chain, version_stats, version_timeline
 
-# Создаём таблицы
+# Создаём таблицы и досоздаём колонки, добавленные после их создания
 models.Base.metadata.create_all(bind=engine)
+upgrade_schema(models.Base.metadata)
+# Пул задач живёт в процессе: незавершённые задачи прошлого запуска уже не выполнятся
+fail_stale_jobs()
 
 app = FastAPI(title="Data Quality Platform")
 
@@ -57,10 +73,6 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
 
 app.add_middleware(SecurityHeadersMiddleware)
 
-# Директория для загрузок
-UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "/data/uploads"))
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-
 
 @app.get("/")
 def read_root():
@@ -72,10 +84,89 @@ def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/cache/stats")
+def cache_stats():
+    """Статистика кэша DataFrame: попадания, промахи, вытеснения"""
+    return dataframe_cache.stats()
+
+
+def check_ingest(ingest: dict) -> None:
+    """Проверяем результат потокового чтения и удаляем временный файл при отказе"""
+
+    try:
+        # 3. Проверка размера
+        if not ingest["size_ok"]:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "error": "File too large",
+                    "reason": f"File size exceeds {MAX_FILE_SIZE_MB}MB limit",
+                    "explanation": f"Maximum allowed file size is {MAX_FILE_SIZE_MB}MB",
+                    "how_to_fix": "Split your file into smaller parts and upload separately"
+                }
+            )
+
+        # 4. Проверка структуры CSV
+        structure = ingest["structure"]
+        if not structure["valid"]:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "error": "Invalid CSV structure",
+                    "reason": structure["reason"],
+                    "explanation": "The file does not appear to be a valid CSV",
+                    "how_to_fix": (
+                        "Make sure your file: "
+                        "1) Has a header row, "
+                        "2) Has at least one data row, "
+                        "3) Uses one separator consistently (comma, semicolon, tab or pipe), "
+                        "4) Is saved in UTF-8 encoding"
+                    )
+                }
+            )
+
+        # 5. Сканирование на опасный контент
+        scan = ingest["scan"]
+        if not scan["safe"]:
+            # Формируем понятное объяснение
+            details = []
+            for issue in scan["issues"]:
+                if issue.get("reason"):
+                    details.append(f"Row {issue['line']}: {issue['reason']}")
+                    continue
+                details.append(
+                    f"Row {issue['line']}, column {issue['cell']}: "
+                    f"'{issue['value']}' looks like a dangerous formula or script"
+                )
+
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "error": "Security check failed",
+                    "reason": "Your CSV file contains potentially dangerous content",
+                    "explanation": (
+                        "CSV files can contain formula injections (e.g. =SUM(), +cmd) "
+                        "or scripts (<script>, javascript:) that could be harmful. "
+                        "Please remove these values and try again."
+                    ),
+                    "found_issues": details,
+                    "how_to_fix": (
+                        "Remove or replace values starting with =FORMULA(), "
+                        "+cmd|, @FORMULA(), <script>, or javascript:"
+                    )
+                }
+            )
+    except HTTPException:
+        if ingest["tmp_path"] is not None:
+            ingest["tmp_path"].unlink(missing_ok=True)
+        raise
+
+
 @app.post("/datasets/upload", response_model=schemas.DatasetResponse)
 @limiter.limit("10/minute")  # Максимум 10 загрузок в минуту
 async def upload_dataset(
     request: Request,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
@@ -93,94 +184,41 @@ async def upload_dataset(
             }
         )
 
-    # 2. Читаем содержимое
-    content = await file.read()
-
-    # 3. Проверка размера
-    if not validate_file_size(content):
-        raise HTTPException(
-            status_code=400,
-            detail={
-                "error": "File too large",
-                "reason": f"File size exceeds {MAX_FILE_SIZE_MB}MB limit",
-                "explanation": f"Maximum allowed file size is {MAX_FILE_SIZE_MB}MB",
-                "how_to_fix": "Split your file into smaller parts and upload separately"
-            }
-        )
-
-    # 4. Проверка структуры CSV
-    structure = validate_csv_structure(content)
-    if not structure["valid"]:
-        raise HTTPException(
-            status_code=400,
-            detail={
-                "error": "Invalid CSV structure",
-                "reason": structure["reason"],
-                "explanation": "The file does not appear to be a valid CSV",
-                "how_to_fix": (
-                    "Make sure your file: "
-                    "1) Has a header row, "
-                    "2) Has at least one data row, "
-                    "3) Uses comma as separator, "
-                    "4) Is saved in UTF-8 encoding"
-                )
-            }
-        )
-
-    # 5. Сканирование на опасный контент
-    scan = scan_csv_content(content)
-    if not scan["safe"]:
-        # Формируем понятное объяснение
-        details = []
-        for issue in scan["issues"]:
-            details.append(
-                f"Row {issue['line']}, column {issue['cell']}: "
-                f"'{issue['value']}' looks like a dangerous formula or script"
-            )
-
-        raise HTTPException(
-            status_code=400,
-            detail={
-                "error": "Security check failed",
-                "reason": "Your CSV file contains potentially dangerous content",
-                "explanation": (
-                    "CSV files can contain formula injections (e.g. =SUM(), +cmd) "
-                    "or scripts (<script>, javascript:) that could be harmful. "
-                    "Please remove these values and try again."
-                ),
-                "found_issues": details,
-                "how_to_fix": (
-                    "Remove or replace values starting with =FORMULA(), "
-                    "+cmd|, @FORMULA(), <script>, or javascript:"
-                )
-            }
-        )
+    # 2. Потоково читаем файл: размер, структура, сканер, хеш и запись на диск
+    ingest = await ingest_upload(file, UPLOAD_DIR)
+    check_ingest(ingest)
 
     # 6. Безопасное имя файла
     safe_filename = sanitize_filename(file.filename)
 
-    # 7. Дедупликация по хешу
-    file_hash = compute_file_hash(content)
+    # 7. Дедупликация по хешу: то же содержимое уже загружено — отдаём его
+    file_hash = ingest["file_hash"]
+    existing = find_by_hash(db, file_hash, root_only=True)
+    if existing:
+        ingest["tmp_path"].unlink(missing_ok=True)
+        return existing
 
-    # 8. Сохраняем файл
-    file_path = UPLOAD_DIR / safe_filename
-    with open(file_path, "wb") as f:
-        f.write(content)
+    # 8. Кладём файл в контентно-адресуемое хранилище
+    file_path = store_blob(ingest["tmp_path"], file_hash)
 
     # 9. Создаём запись в БД
-    import pandas as pd
-    df = pd.read_csv(file_path)
-
+    structure = ingest["structure"]
     dataset = models.Dataset(
         name=safe_filename,
         file_path=str(file_path),
-        total_rows=len(df),
-        total_columns=len(df.columns)
+        content_hash=file_hash,
+        delimiter=structure["delimiter"],
+        encoding=structure["encoding"],
+        total_rows=structure["rows"],
+        total_columns=structure["columns"]
     )
     db.add(dataset)
     db.commit()
     db.refresh(dataset)
 
+    # 10. Колоночная копия строится после ответа, чтобы не задерживать загрузку
+    background_tasks.add_task(ensure_columnar, dataset)
+
     return dataset
 
 
@@ -201,53 +239,63 @@ def get_dataset(dataset_id: int, db: Session = Depends(get_db)):
 
 
 @app.post("/datasets/{dataset_id}/profile")
-def create_profile(dataset_id: int, db: Session = Depends(get_db)):
-    """Запустить анализ качества датасета"""
+def create_profile(
+    dataset_id: int,
+    mode: str = "sync",
+    refresh: bool = False,
+    engine: str = "auto",
+    duplicates: str = "exact",
+    anomalies: str = "auto",
+    db: Session = Depends(get_db)
+):
+    """Запустить анализ качества датасета (mode=async — в фоне, с опросом статуса;
+    engine=chunked — потоково, без загрузки файла в память;
+    duplicates=approx — оценка дубликатов через HyperLogLog;
+    anomalies=sampled — IsolationForest на выборке, full — на всех строках)"""
+
+    if mode not in ("sync", "async"):
+        raise HTTPException(status_code=400, detail="mode must be 'sync' or 'async'")
+    if engine not in PROFILE_ENGINES:
+        raise HTTPException(status_code=400, detail=f"engine must be one of {', '.join(PROFILE_ENGINES)}")
+    if duplicates not in DUPLICATE_MODES:
+        raise HTTPException(status_code=400, detail=f"duplicates must be one of {', '.join(DUPLICATE_MODES)}")
+    if anomalies not in ANOMALY_MODES:
+        raise HTTPException(status_code=400, detail=f"anomalies must be one of {', '.join(ANOMALY_MODES)}")
 
     # Находим датасет
     dataset = db.query(models.Dataset).filter(models.Dataset.id == dataset_id).first()
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
 
-    # Читаем CSV
-    import pandas as pd
-    df = pd.read_csv(dataset.file_path)
-
-    # Анализируем
-    profile = profile_dataset(df)
-    anomalies = detect_anomalies(df)
-    quality_score = calculate_quality_score(profile, anomalies)
-    issues = detect_issues(profile, anomalies)
+    if mode == "async":
+        job = submit_profile_job(db, dataset, {
+            "refresh": refresh, "engine": engine, "duplicates": duplicates, "anomalies": anomalies
+        })
+        return JSONResponse(status_code=202, content=jsonable_encoder(job_to_dict(job)))
 
-    # Сохраняем профиль в БД
-    db_profile = models.QualityProfile(
-        dataset_id=dataset_id,
-        metrics={
-            "profile": profile,
-            "anomalies": anomalies
-        },
-        quality_score=quality_score
+    result = run_profile(
+        db, dataset, refresh=refresh, engine=engine, duplicates=duplicates, anomalies_mode=anomalies
     )
-    db.add(db_profile)
+    result.pop("profile_id")
+    return result
 
-    # Сохраняем проблемы в БД
-    for issue in issues:
-        db_issue = models.QualityIssue(
-            dataset_id=dataset_id,
-            **issue
-        )
-        db.add(db_issue)
 
-    db.commit()
-    db.refresh(db_profile)
+@app.get("/jobs/{job_id}")
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    """Статус фоновой задачи"""
 
-    return {
-        "dataset_id": dataset_id,
-        "quality_score": quality_score,
-        "profile": profile,
-        "anomalies": anomalies,
-        "issues": issues
-    }
+    job = db.query(models.Job).filter(models.Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    result = job_to_dict(job)
+    if job.status == "done" and job.profile_id:
+        profile = db.query(models.QualityProfile) \
+            .filter(models.QualityProfile.id == job.profile_id).first()
+        if profile:
+            result["quality_score"] = profile.quality_score
+
+    return result
 
 
 @app.get("/datasets/{dataset_id}/profile")
@@ -354,12 +402,12 @@ def ai_suggest_column_rules(
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
 
-    import pandas as pd
-    df = pd.read_csv(dataset.file_path)
-
-    if column_name not in df.columns:
+    if column_name not in dataset_columns(dataset):
         raise HTTPException(status_code=404, detail=f"Column '{column_name}' not found")
 
+    # Читаем только нужную колонку
+    df = load_dataframe(dataset, columns=[column_name])
+
     # Собираем информацию о колонке
     sample_values = df[column_name].dropna().head(10).tolist()
     dtype = str(df[column_name].dtype)
@@ -393,6 +441,10 @@ def add_validation_rule(
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
 
+    problem = rule_problem(rule.rule_type, rule.parameters)
+    if problem:
+        raise HTTPException(status_code=400, detail=problem)
+
     db_rule = models.ValidationRule(
         dataset_id=dataset_id,
         column_name=rule.column_name,
@@ -417,8 +469,25 @@ def get_rules(dataset_id: int, db: Session = Depends(get_db)):
 
 
 @app.post("/datasets/{dataset_id}/validate")
-def validate_dataset(dataset_id: int, db: Session = Depends(get_db)):
-    """Выполнить валидацию датасета по всем правилам"""
+def validate_dataset(
+    dataset_id: int,
+    sample_size: int = VIOLATION_SAMPLE_SIZE,
+    sampling: str = "first",
+    engine: str = "auto",
+    stream: bool = False,
+    db: Session = Depends(get_db)
+):
+    """Выполнить валидацию датасета по всем правилам
+    (sample_size — сколько нарушений показать по правилу, sampling=random — случайные вместо первых;
+    engine=chunked — потоково, без загрузки файла в память).
+    Ответ — только счётчики; примеры нарушений — в /violations или с stream=true"""
+
+    if not 0 <= sample_size <= MAX_VIOLATION_SAMPLE_SIZE:
+        raise HTTPException(status_code=400, detail=f"sample_size must be between 0 and {MAX_VIOLATION_SAMPLE_SIZE}")
+    if sampling not in SAMPLING_MODES:
+        raise HTTPException(status_code=400, detail=f"sampling must be one of {', '.join(SAMPLING_MODES)}")
+    if engine not in PROFILE_ENGINES:
+        raise HTTPException(status_code=400, detail=f"engine must be one of {', '.join(PROFILE_ENGINES)}")
 
     dataset = db.query(models.Dataset) \
         .filter(models.Dataset.id == dataset_id).first()
@@ -427,104 +496,72 @@ def validate_dataset(dataset_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Dataset not found")
 
     rules = db.query(models.ValidationRule) \
-        .filter(models.ValidationRule.dataset_id == dataset_id).all()
+        .filter(models.ValidationRule.dataset_id == dataset_id) \
+        .order_by(models.ValidationRule.id).all()
 
     if not rules:
         return {"status": "no_rules", "message": "No validation rules defined"}
 
-    df = pd.read_csv(dataset.file_path)
-
-    results = []
-    overall_status = "PASSED"
-
-    for rule in rules:
-        col = rule.column_name
-
-        if col not in df.columns:
-            results.append({
-                "rule_id": rule.id,
-                "column": col,
-                "rule_type": rule.rule_type,
-                "parameters": rule.parameters,
-                "status": "ERROR",
-                "message": f"Column '{col}' not found in dataset",
-                "violations": 0,
-                "violation_details": []
-            })
-            overall_status = "FAILED"
-            continue
-
-        mask = pd.Series([False] * len(df))
-
-        if rule.rule_type == "not_null":
-            mask = df[col].isnull()
-
-        elif rule.rule_type == "unique":
-            mask = df[col].duplicated(keep=False)
-
-        elif rule.rule_type == "range":
-            params = rule.parameters
-            min_val = params.get("min")
-            max_val = params.get("max")
-
-            if df[col].dtype in ['int64', 'float64', 'int32', 'float32']:
-                if min_val is not None:
-                    mask = mask | (df[col] < min_val)
-                if max_val is not None:
-                    mask = mask | (df[col] > max_val)
-            else:
-                results.append({
-                    "rule_id": rule.id,
-                    "column": col,
-                    "rule_type": rule.rule_type,
-                    "parameters": rule.parameters,
-                    "status": "SKIPPED",
-                    "message": f"Column '{col}' is not numeric (type: {df[col].dtype}). Range rule skipped.",
-                    "violations": 0,
-                    "violation_details": []
-                })
-                continue
-
-        elif rule.rule_type == "regex":
-            pattern = rule.parameters.get("pattern")
-            if pattern:
-                mask = ~df[col].astype(str).str.match(pattern, na=False)
-
-        violations = mask.sum()
-
-        # Формируем детальную информацию о нарушениях
-        violation_details = []
-        if violations > 0:
-            violated_rows = df[mask].head(50)
-            for idx, row in violated_rows.iterrows():
-                violation_details.append({
-                    "row_index": int(idx),
-                    "column_value": str(row[col])[:100],
-                    "row_data": {k: str(v)[:50] for k, v in row.to_dict().items()}
-                })
-
-        status = "FAILED" if violations > 0 else "PASSED"
-        if status == "FAILED":
-            overall_status = "FAILED"
-
-        results.append({
-            "rule_id": rule.id,
-            "column": col,
-            "rule_type": rule.rule_type,
-            "parameters": rule.parameters,
-            "status": status,
-            "message": f"Found {violations} violations" if violations > 0 else "All values valid",
-            "violations": int(violations),
-            "violation_details": violation_details
-        })
+    run = run_validation(db, dataset, rules, sample_size, sampling, engine)
+    return _run_response(run, stream)
 
-    return {
-        "overall_status": overall_status,
-        "total_rules": len(rules),
-        "passed": sum(1 for r in results if r["status"] == "PASSED"),
-        "failed": sum(1 for r in results if r["status"] == "FAILED"),
-        "results": results
-    }
+
+def _run_response(run: models.ValidationRun, stream: bool):
+    """Итог прогона; stream=true — NDJSON: строка итога и по строке на правило с примерами"""
+
+    if not stream:
+        return run_to_dict(run)
+    lines = (json.dumps(jsonable_encoder(line)) + "\n" for line in run_lines(run))
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
+@app.get("/datasets/{dataset_id}/validate/latest")
+def get_latest_validation(dataset_id: int, stream: bool = False, db: Session = Depends(get_db)):
+    """Последний сохранённый прогон валидации"""
+
+    run = latest_run(db, dataset_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="No validation runs yet")
+    return _run_response(run, stream)
+
+
+@app.get("/datasets/{dataset_id}/validate/{run_id}")
+def get_validation_run(dataset_id: int, run_id: int, stream: bool = False, db: Session = Depends(get_db)):
+    """Сохранённый прогон валидации по id"""
+
+    run = find_run(db, dataset_id, run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Validation run not found")
+    return _run_response(run, stream)
+
+
+@app.get("/datasets/{dataset_id}/validate/{run_id}/rules/{rule_id}/violations")
+def get_rule_violations(
+    dataset_id: int,
+    run_id: int,
+    rule_id: int,
+    cursor: int = 0,
+    limit: int = VIOLATION_SAMPLE_SIZE,
+    db: Session = Depends(get_db)
+):
+    """Нарушения правила постранично: cursor — с какого нарушения, next_cursor — следующая страница"""
+
+    if cursor < 0:
+        raise HTTPException(status_code=400, detail="cursor must be non-negative")
+    if not 1 <= limit <= MAX_VIOLATION_SAMPLE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_VIOLATION_SAMPLE_SIZE}")
+
+    run = find_run(db, dataset_id, run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Validation run not found")
+
+    result = find_result(db, run, rule_id)
+    if not result:
+        raise HTTPException(status_code=404, detail="Rule not found in this run")
+    if result.violations and not (result.violations_path and os.path.exists(result.violations_path)):
+        raise HTTPException(status_code=404, detail="Violation positions are no longer available")
+
+    return {"run_id": run.id, **violations_page(run.dataset, result, cursor, limit)}
 
 
 @app.delete("/datasets/{dataset_id}/rules/{rule_id}")
@@ -547,6 +584,7 @@ def delete_rule(dataset_id: int, rule_id: int, db: Session = Depends(get_db)):
 @app.post("/datasets/{dataset_id}/new-version")
 async def upload_new_version(
     dataset_id: int,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
@@ -561,10 +599,9 @@ async def upload_new_version(
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="Only CSV files allowed")
 
-    # Читаем файл
-    content = await file.read()
-    if len(content) > 100 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="File too large")
+    # Потоково читаем файл и проверяем его так же, как при первой загрузке
+    ingest = await ingest_upload(file, UPLOAD_DIR)
+    check_ingest(ingest)
 
     # Определяем корневой датасет
     root_id = original.parent_id if original.parent_id else original.id
@@ -581,27 +618,27 @@ async def upload_new_version(
     # Используем ОРИГИНАЛЬНОЕ имя файла, но добавляем версию
     original_name = file.filename.replace('.csv', '')
     new_filename = f"{original_name}_v{new_version}.csv"
-    file_path = UPLOAD_DIR / new_filename
-
-    with open(file_path, "wb") as f:
-        f.write(content)
-
-    import pandas as pd
-    df = pd.read_csv(file_path)
+    file_path = store_blob(ingest["tmp_path"], ingest["file_hash"])
 
     # Создаём запись новой версии
+    structure = ingest["structure"]
     new_dataset = models.Dataset(
         name=new_filename,
         version=new_version,
         file_path=str(file_path),
-        total_rows=len(df),
-        total_columns=len(df.columns),
+        content_hash=ingest["file_hash"],
+        delimiter=structure["delimiter"],
+        encoding=structure["encoding"],
+        total_rows=structure["rows"],
+        total_columns=structure["columns"],
         parent_id=root_id  # Важно! Указываем корень
     )
     db.add(new_dataset)
     db.commit()
     db.refresh(new_dataset)
 
+    background_tasks.add_task(ensure_columnar, new_dataset)
+
     return {
         "message": f"Version {new_version} created",
         "root_id": root_id,
@@ -619,9 +656,13 @@ async def upload_new_version(
 def compare_datasets(
     dataset_id: int,
     other_id: int,
+    source: str = "auto",
     db: Session = Depends(get_db)
 ):
-    """Сравнить два датасета"""
+    """Сравнить два датасета (source=profile — только по сохранённым профилям, без чтения файлов)"""
+
+    if source not in COMPARE_SOURCES:
+        raise HTTPException(status_code=400, detail=f"source must be one of {', '.join(COMPARE_SOURCES)}")
 
     ds1 = db.query(models.Dataset).filter(models.Dataset.id == dataset_id).first()
     ds2 = db.query(models.Dataset).filter(models.Dataset.id == other_id).first()
@@ -629,21 +670,92 @@ def compare_datasets(
     if not ds1 or not ds2:
         raise HTTPException(status_code=404, detail="Dataset not found")
 
-    import pandas as pd
-    df1 = pd.read_csv(ds1.file_path)
-    df2 = pd.read_csv(ds2.file_path)
+    try:
+        stats1, rows1, source1 = version_stats(db, ds1, source)
+        stats2, rows2, source2 = version_stats(db, ds2, source)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    comparison  = compare_versions(df1, df2)
+    comparison  = compare_stats(stats1, stats2, rows1, rows2)
     drift_score = calculate_drift_score(comparison)
 
     return {
-        "dataset_a": {"id": ds1.id, "name": ds1.name, "version": ds1.version},
-        "dataset_b": {"id": ds2.id, "name": ds2.name, "version": ds2.version},
+        "dataset_a": {"id": ds1.id, "name": ds1.name, "version": ds1.version, "source": source1},
+        "dataset_b": {"id": ds2.id, "name": ds2.name, "version": ds2.version, "source": source2},
         "drift_score": drift_score,
         "comparison": comparison
     }
 
 
+@app.post("/datasets/{dataset_id}/diff/{other_id}")
+def diff_datasets(
+    dataset_id: int,
+    other_id: int,
+    keys: list[str] = Query([]),
+    engine: str = "auto",
+    db: Session = Depends(get_db)
+):
+    """Построчный diff: какие ключи (keys=a&keys=b) добавлены, удалены и изменены в other_id
+    относительно dataset_id. Ответ — только счётчики; строки — в /diff/{diff_id}/rows"""
+
+    if engine not in PROFILE_ENGINES:
+        raise HTTPException(status_code=400, detail=f"engine must be one of {', '.join(PROFILE_ENGINES)}")
+    if not keys:
+        raise HTTPException(status_code=400, detail="At least one key column is required (keys=...)")
+    if len(set(keys)) != len(keys):
+        raise HTTPException(status_code=400, detail="Key columns must be distinct")
+
+    old = db.query(models.Dataset).filter(models.Dataset.id == dataset_id).first()
+    new = db.query(models.Dataset).filter(models.Dataset.id == other_id).first()
+
+    if not old or not new:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    try:
+        row_diff = run_diff(db, old, new, keys, engine)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return diff_to_dict(row_diff)
+
+
+@app.get("/datasets/{dataset_id}/diff/{diff_id}")
+def get_diff(dataset_id: int, diff_id: int, db: Session = Depends(get_db)):
+    """Сохранённый diff по id (датасет — старая или новая версия)"""
+
+    row_diff = find_diff(db, dataset_id, diff_id)
+    if not row_diff:
+        raise HTTPException(status_code=404, detail="Diff not found")
+    return diff_to_dict(row_diff)
+
+
+@app.get("/datasets/{dataset_id}/diff/{diff_id}/rows")
+def get_diff_rows(
+    dataset_id: int,
+    diff_id: int,
+    change: str = "updated",
+    cursor: int = 0,
+    limit: int = VIOLATION_SAMPLE_SIZE,
+    db: Session = Depends(get_db)
+):
+    """Строки diff постранично: change=inserted|deleted|updated, cursor — с какой строки,
+    next_cursor — следующая страница"""
+
+    if change not in DIFF_CHANGES:
+        raise HTTPException(status_code=400, detail=f"change must be one of {', '.join(DIFF_CHANGES)}")
+    if cursor < 0:
+        raise HTTPException(status_code=400, detail="cursor must be non-negative")
+    if not 1 <= limit <= MAX_VIOLATION_SAMPLE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_VIOLATION_SAMPLE_SIZE}")
+
+    row_diff = find_diff(db, dataset_id, diff_id)
+    if not row_diff:
+        raise HTTPException(status_code=404, detail="Diff not found")
+    if not diff_available(row_diff):
+        raise HTTPException(status_code=404, detail="Diff rows are no longer available")
+
+    return {"diff_id": row_diff.id, **diff_page(row_diff, change, cursor, limit)}
+
+
 @app.get("/datasets/{dataset_id}/versions")
 def get_versions(dataset_id: int, db: Session = Depends(get_db)):
     """Получить все версии датасета"""
@@ -654,46 +766,101 @@ def get_versions(dataset_id: int, db: Session = Depends(get_db)):
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
 
-    # Если у него есть parent — ищем все версии от корня
-    root_id = dataset.parent_id if dataset.parent_id else dataset.id
+    # Все версии от корня (включая корень)
+    all_versions = version_chain(db, dataset)
 
-    # Все версии с этим root_id (включая корень)
-    all_versions = db.query(models.Dataset).filter(
-        (models.Dataset.id == root_id) |
-        (models.Dataset.parent_id == root_id)
-    ).order_by(models.Dataset.version).all()
+    return {
+        "dataset_id": dataset_id,
+        "root_id": root_id_of(dataset),
+        "versions": [_version_to_dict(v) for v in all_versions]
+    }
+
+
+def _version_to_dict(v: models.Dataset) -> dict:
+    return {
+        "id": v.id,
+        "name": v.name,
+        "version": v.version,
+        "upload_date": v.upload_date,
+        "total_rows": v.total_rows,
+        "total_columns": v.total_columns
+    }
+
+
+@app.get("/datasets/{dataset_id}/timeline")
+def get_timeline(dataset_id: int, db: Session = Depends(get_db)):
+    """Дрейф между каждой парой соседних версий цепочки — одним запросом
+    (пары считаются один раз и кэшируются по содержимому версий)"""
+
+    dataset = db.query(models.Dataset) \
+        .filter(models.Dataset.id == dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    all_versions = version_chain(db, dataset)
 
     return {
         "dataset_id": dataset_id,
+        "root_id": root_id_of(dataset),
+        "versions": [_version_to_dict(v) for v in all_versions],
+        "pairs": version_timeline(db, all_versions)
+    }
+
+@app.get("/datasets/{dataset_id}/anomaly-models")
+def list_anomaly_models(dataset_id: int, db: Session = Depends(get_db)):
+    """Модели аномалий цепочки версий: по одной на набор числовых колонок"""
+
+    dataset = db.query(models.Dataset).filter(models.Dataset.id == dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    root_id = root_id_of(dataset)
+    entries = db.query(models.AnomalyModel) \
+        .filter(models.AnomalyModel.root_id == root_id) \
+        .order_by(models.AnomalyModel.created_at) \
+        .all()
+
+    return {
         "root_id": root_id,
-        "versions": [
-            {
-                "id": v.id,
-                "name": v.name,
-                "version": v.version,
-                "upload_date": v.upload_date,
-                "total_rows": v.total_rows,
-                "total_columns": v.total_columns
-            }
-            for v in all_versions
-        ]
+        "models": [model_to_dict(entry) for entry in entries]
     }
 
+
+@app.delete("/datasets/{dataset_id}/anomaly-models/{model_id}")
+def delete_anomaly_model(dataset_id: int, model_id: int, db: Session = Depends(get_db)):
+    """Удалить модель аномалий — следующее профилирование обучит новую базовую"""
+
+    dataset = db.query(models.Dataset).filter(models.Dataset.id == dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    entry = db.query(models.AnomalyModel) \
+        .filter(models.AnomalyModel.id == model_id) \
+        .filter(models.AnomalyModel.root_id == root_id_of(dataset)) \
+        .first()
+    if not entry:
+        raise HTTPException(status_code=404, detail="Anomaly model not found")
+
+    delete_model(db, entry)
+    return {"message": "Anomaly model deleted", "deleted_id": model_id}
+
+
 @app.post("/datasets/security-check")
 @limiter.limit("20/minute")
 async def security_check(request: Request, file: UploadFile = File(...)):
     """Проверить файл на безопасность без загрузки"""
 
-    content = await file.read()
+    # Ничего не сохраняем на диск — только считаем проверки потоково
+    ingest = await ingest_upload(file)
 
     return {
         "filename": sanitize_filename(file.filename),
-        "size_mb": round(len(content) / 1024 / 1024, 3),
-        "size_ok": validate_file_size(content),
+        "size_mb": round(ingest["size"] / 1024 / 1024, 3),
+        "size_ok": ingest["size_ok"],
         "extension_ok": validate_file_extension(file.filename),
-        "structure": validate_csv_structure(content),
-        "security_scan": scan_csv_content(content),
-        "file_hash": compute_file_hash(content)
+        "structure": ingest["structure"],
+        "security_scan": ingest["scan"],
+        "file_hash": ingest["file_hash"]
     }
 
 
@@ -708,14 +875,6 @@ def delete_dataset(dataset_id: int, db: Session = Depends(get_db)):
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
 
-    # Удаляем файл с диска
-    import os
-    if os.path.exists(dataset.file_path):
-        try:
-            os.remove(dataset.file_path)
-        except Exception:
-            pass  # Если файл не удалился — не критично
-
     # Удаляем связанные данные (каскадное удаление настроено в БД)
     # Profiles, Rules, Issues удалятся автоматически
 
@@ -733,6 +892,16 @@ def delete_dataset(dataset_id: int, db: Session = Depends(get_db)):
             detail=f"Cannot delete: {len(children)} version(s) depend on this dataset ({child_names}). Delete them first."
         )
 
+    # Удаляем файл с диска (блоб остаётся, если его делят другие датасеты)
+    release_file(db, dataset)
+    dataframe_cache.invalidate(dataset_id)
+
+    # Модели аномалий корня больше никому не нужны
+    for entry in dataset.anomaly_models:
+        delete_model(db, entry)
+    delete_runs(db, dataset)
+    delete_diffs(db, dataset)
+
     # Удаляем из БД
     db.delete(dataset)
     db.commit()
@@ -0,0 +1,99 @@
+import hashlib
+import os
+from typing import Optional
+
+import joblib
+from sqlalchemy.orm import Session
+
+from . import models
+from .storage import UPLOAD_DIR
+
+# Обученные модели аномалий: models/<root_id>/<signature>.joblib
+MODEL_DIR = UPLOAD_DIR / "models"
+
+
+def root_id_of(dataset: models.Dataset) -> int:
+    """Все версии ссылаются на корень через parent_id"""
+    return dataset.parent_id if dataset.parent_id else dataset.id
+
+
+def column_signature(columns: list) -> str:
+    """Подпись набора числовых колонок: модель подходит только к тем же колонкам в том же порядке"""
+    return hashlib.sha256("\x1f".join(map(str, columns)).encode()).hexdigest()
+
+
+def find_model(db: Session, dataset: models.Dataset, columns: list) -> Optional[models.AnomalyModel]:
+    """Запись реестра для цепочки версий датасета и набора колонок"""
+
+    return db.query(models.AnomalyModel) \
+        .filter(models.AnomalyModel.root_id == root_id_of(dataset)) \
+        .filter(models.AnomalyModel.signature == column_signature(columns)) \
+        .first()
+
+
+def load_model(db: Session, dataset: models.Dataset, columns: list) -> Optional[dict]:
+    """Базовая модель (лес, колонки, медианы) или None, если её ещё нет или файл не читается"""
+
+    entry = find_model(db, dataset, columns)
+    if entry is None:
+        return None
+    try:
+        return joblib.load(entry.file_path)
+    except Exception:
+        return None
+
+
+def register_model(db: Session, dataset: models.Dataset, model: dict) -> models.AnomalyModel:
+    """Сохраняем модель на диск и в реестр; существующая запись с той же подписью перезаписывается"""
+
+    root_id = root_id_of(dataset)
+    signature = column_signature(model["columns"])
+    path = MODEL_DIR / str(root_id) / f"{signature}.joblib"
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp_path = path.with_suffix(".part")
+    try:
+        joblib.dump(model, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    entry = find_model(db, dataset, model["columns"])
+    if entry is None:
+        entry = models.AnomalyModel(root_id=root_id, signature=signature)
+        db.add(entry)
+    entry.columns = model["columns"]
+    entry.file_path = str(path)
+    entry.trained_on = dataset.id
+    entry.sample_size = model["sample_size"]
+    entry.fit_seconds = model["fit_seconds"]
+    db.commit()
+    db.refresh(entry)
+    return entry
+
+
+def delete_model(db: Session, entry: models.AnomalyModel) -> None:
+    """Удаляем запись и файл модели — следующее профилирование обучит новую"""
+
+    if os.path.exists(entry.file_path):
+        try:
+            os.remove(entry.file_path)
+        except Exception:
+            pass  # Если файл не удалился — не критично
+    db.delete(entry)
+    db.commit()
+
+
+def model_to_dict(entry: models.AnomalyModel) -> dict:
+    """Представление записи реестра для API"""
+
+    return {
+        "id": entry.id,
+        "root_id": entry.root_id,
+        "signature": entry.signature,
+        "columns": entry.columns,
+        "trained_on": entry.trained_on,
+        "sample_size": entry.sample_size,
+        "fit_seconds": entry.fit_seconds,
+        "created_at": entry.created_at
+    }
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Float, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -11,6 +11,9 @@ class Dataset(Base):
     name = Column(String, nullable=False)
     version = Column(Integer, default=1)
     file_path = Column(String, nullable=False)
+    content_hash = Column(String, index=True)  # SHA256 содержимого, ключ блоба
+    delimiter = Column(String, default=",")  # определяется при загрузке
+    encoding = Column(String, default="utf-8")
     upload_date = Column(DateTime, default=datetime.utcnow)
     total_rows = Column(Integer)
     total_columns = Column(Integer)
@@ -20,6 +23,9 @@ class Dataset(Base):
     profiles = relationship("QualityProfile", back_populates="dataset")
     rules = relationship("ValidationRule", back_populates="dataset")
     issues = relationship("QualityIssue", back_populates="dataset")
+    jobs = relationship("Job", back_populates="dataset")
+    anomaly_models = relationship("AnomalyModel", back_populates="root")
+    validation_runs = relationship("ValidationRun", back_populates="dataset")
     versions = relationship("Dataset", backref=backref("parent", remote_side=[id]))
 
 
@@ -62,4 +68,121 @@ class QualityIssue(Base):
     affected_rows = Column(Integer)
     created_at = Column(DateTime, default=datetime.utcnow)
 
-    dataset = relationship("Dataset", back_populates="issues")
\ No newline at end of file
+    dataset = relationship("Dataset", back_populates="issues")
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    dataset_id = Column(Integer, ForeignKey("datasets.id"))
+    kind = Column(String, nullable=False)  # profile
+    status = Column(String, nullable=False, default="queued")  # queued, running, done, failed
+    progress = Column(Integer, default=0)  # 0-100
+    options = Column(JSON)  # параметры запуска
+    error = Column(String)
+    profile_id = Column(Integer, ForeignKey("quality_profiles.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    dataset = relationship("Dataset", back_populates="jobs")
+
+
+class AnomalyModel(Base):
+    __tablename__ = "anomaly_models"
+
+    id = Column(Integer, primary_key=True, index=True)
+    root_id = Column(Integer, ForeignKey("datasets.id"), index=True)  # корень цепочки версий
+    signature = Column(String, nullable=False, index=True)  # хеш набора числовых колонок
+    columns = Column(JSON)  # числовые колонки в порядке обучения
+    file_path = Column(String, nullable=False)  # joblib с лесом и медианами
+    trained_on = Column(Integer)  # id версии, на которой обучали
+    sample_size = Column(Integer)
+    fit_seconds = Column(Float)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    root = relationship("Dataset", back_populates="anomaly_models")
+
+
+class ValidationRun(Base):
+    __tablename__ = "validation_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    dataset_id = Column(Integer, ForeignKey("datasets.id"), index=True)
+    content_hash = Column(String, index=True)  # содержимое датасета, на котором проверяли
+    rules_hash = Column(String, index=True)  # набор правил и параметры выборки нарушений
+    sample_size = Column(Integer)
+    sampling = Column(String)
+    overall_status = Column(String)
+    total_rules = Column(Integer)
+    passed = Column(Integer)
+    failed = Column(Integer)
+    invalid_rows = Column(Integer)
+    reused_rules = Column(Integer)  # сколько результатов взято из прошлого прогона
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    dataset = relationship("Dataset", back_populates="validation_runs")
+    results = relationship(
+        "ValidationResult", back_populates="run",
+        order_by="ValidationResult.position", cascade="all, delete-orphan"
+    )
+
+
+class ValidationResult(Base):
+    __tablename__ = "validation_results"
+
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(Integer, ForeignKey("validation_runs.id"), index=True)
+    position = Column(Integer)  # порядок правила в ответе
+    rule_id = Column(Integer)  # правило могут удалить, результат прошлых прогонов остаётся
+    rule_hash = Column(String)  # колонка, тип и параметры правила
+    column_name = Column(String)
+    rule_type = Column(String)
+    parameters = Column(JSON)
+    status = Column(String)  # PASSED, FAILED, SKIPPED, ERROR
+    message = Column(String)
+    violations = Column(Integer)
+    violation_details = Column(JSON)
+    violations_path = Column(String)  # .npy с позициями всех нарушающих строк
+
+    run = relationship("ValidationRun", back_populates="results")
+
+
+class RowDiff(Base):
+    __tablename__ = "row_diffs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    dataset_id = Column(Integer, ForeignKey("datasets.id"), index=True)  # старая версия
+    other_id = Column(Integer, ForeignKey("datasets.id"), index=True)  # новая версия
+    diff_key = Column(String, index=True)  # содержимое обеих версий и ключевые колонки
+    key_columns = Column(JSON)
+    engine = Column(String)  # memory, chunked
+    old_rows = Column(Integer)
+    new_rows = Column(Integer)
+    inserted = Column(Integer)
+    deleted = Column(Integer)
+    updated = Column(Integer)
+    unchanged = Column(Integer)
+    columns = Column(JSON)  # compared / added / removed / retyped колонки
+    column_changes = Column(JSON)  # {колонка: число изменённых строк}
+    duplicate_keys = Column(JSON)  # {"old": n, "new": n} — строк с повторным ключом
+    path = Column(String)  # директория с .npy: позиции строк и матрица изменённых колонок
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    dataset = relationship("Dataset", foreign_keys=[dataset_id])
+    other = relationship("Dataset", foreign_keys=[other_id])
+
+
+class VersionDrift(Base):
+    __tablename__ = "version_drifts"
+    # Одна запись на пару: параллельные запросы не создают дубликатов
+    __table_args__ = (Index("ux_version_drifts_pair", "old_hash", "new_hash", unique=True),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    old_hash = Column(String, index=True)  # содержимое старой версии (cache_token)
+    new_hash = Column(String, index=True)  # содержимое новой версии
+    sources = Column(JSON)  # откуда взяты метрики версий: profile / raw
+    drift_score = Column(JSON)
+    comparison = Column(JSON)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,283 @@
+import re
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+# Длиннее шаблоны не принимаем: разбор и проверка идут при каждом создании правила
+MAX_PATTERN_LENGTH = 500
+
+# Символы, по которым сравниваются множества первых символов элементов шаблона
+_PROBE_CHARS = [chr(c) for c in range(256)] + ["١", "Ж", "中", " ", "　"]
+
+_CATEGORY_PATTERNS = {
+    sre_constants.CATEGORY_DIGIT: r"\d",
+    sre_constants.CATEGORY_NOT_DIGIT: r"\D",
+    sre_constants.CATEGORY_SPACE: r"\s",
+    sre_constants.CATEGORY_NOT_SPACE: r"\S",
+    sre_constants.CATEGORY_WORD: r"\w",
+    sre_constants.CATEGORY_NOT_WORD: r"\W",
+}
+
+_REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) + (
+    (sre_constants.POSSESSIVE_REPEAT,) if hasattr(sre_constants, "POSSESSIVE_REPEAT") else ()
+)
+
+# Конструкции Python re, которых нет в RE2 (движок pyarrow)
+_PYTHON_ONLY = tuple(
+    getattr(sre_constants, name)
+    for name in ("GROUPREF", "GROUPREF_EXISTS", "ASSERT", "ASSERT_NOT", "ATOMIC_GROUP", "POSSESSIVE_REPEAT")
+    if hasattr(sre_constants, name)
+)
+
+# Флаги, при которых классы символов Python и RE2 совпадают только на ASCII
+_UNICODE_FLAGS = re.IGNORECASE | re.ASCII | re.LOCALE
+
+
+def _chars(items, probe: list) -> frozenset:
+    """Какие из пробных символов подходят под класс [...] (IN)"""
+
+    negate = False
+    matched = set()
+    for op, arg in items:
+        if op == sre_constants.NEGATE:
+            negate = True
+        elif op == sre_constants.LITERAL:
+            matched.add(chr(arg))
+        elif op == sre_constants.RANGE:
+            lo, hi = arg
+            matched.update(ch for ch in probe if lo <= ord(ch) <= hi)
+        elif op == sre_constants.CATEGORY and arg in _CATEGORY_PATTERNS:
+            category = re.compile(_CATEGORY_PATTERNS[arg])
+            matched.update(ch for ch in probe if category.match(ch))
+        else:
+            matched.update(probe)
+    if negate:
+        return frozenset(probe) - matched
+    return frozenset(matched)
+
+
+def _first(node, probe: list) -> tuple:
+    """(символы, с которых может начаться совпадение элемента, может ли он быть пустым)"""
+
+    op, arg = node
+    if op == sre_constants.LITERAL:
+        return frozenset([chr(arg)]), False
+    if op == sre_constants.NOT_LITERAL:
+        return frozenset(probe) - {chr(arg)}, False
+    if op == sre_constants.ANY:
+        return frozenset(probe) - {"\n"}, False
+    if op == sre_constants.IN:
+        return _chars(arg, probe), False
+    if op in _REPEATS:
+        lo, _, sub = arg
+        chars, nullable = _first_seq(sub, probe)
+        return chars, nullable or lo == 0
+    if op == sre_constants.SUBPATTERN:
+        return _first_seq(arg[-1], probe)
+    if op == sre_constants.BRANCH:
+        parts = [_first_seq(branch, probe) for branch in arg[1]]
+        return frozenset().union(*(c for c, _ in parts)), any(n for _, n in parts)
+    if op in (sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+        return frozenset(), True
+    # Ссылки на группы и прочее — считаем, что может быть что угодно
+    return frozenset(probe), True
+
+
+def _first_seq(seq, probe: list) -> tuple:
+    chars = set()
+    for node in seq:
+        node_chars, nullable = _first(node, probe)
+        chars |= node_chars
+        if not nullable:
+            return frozenset(chars), False
+    return frozenset(chars), True
+
+
+def _ambiguous(seq, follow: frozenset, probe: list) -> bool:
+    """Может ли тело повторения разбить одну и ту же строку на итерации по-разному
+
+    Внутреннее повторение (или необязательный элемент) неоднозначно, если
+    символ, с которого оно продолжается, может начать и то, что идёт следом:
+    остаток тела, а если он может быть пустым — следующую итерацию (follow).
+    """
+
+    seq = list(seq)
+    for i, node in enumerate(seq):
+        rest_chars, rest_nullable = _first_seq(seq[i + 1:], probe)
+        node_follow = rest_chars | follow if rest_nullable else rest_chars
+
+        op, arg = node
+        if op in _REPEATS:
+            lo, hi, sub = arg
+            if hi > 1 or lo == 0:
+                sub_chars, _ = _first_seq(sub, probe)
+                if sub_chars & node_follow:
+                    return True
+            if _ambiguous(sub, node_follow | _first_seq(sub, probe)[0], probe):
+                return True
+        elif op == sre_constants.SUBPATTERN:
+            if _ambiguous(arg[-1], node_follow, probe):
+                return True
+        elif op == sre_constants.BRANCH:
+            seen = set()
+            for chars, _ in (_first_seq(branch, probe) for branch in arg[1]):
+                if chars & seen:
+                    return True
+                seen |= chars
+            # Пустая ветка: (a|aa)+ разбирается как a(?:|a)+
+            chars, nullable = _first(node, probe)
+            if nullable and chars & node_follow:
+                return True
+            if any(_ambiguous(branch, node_follow, probe) for branch in arg[1]):
+                return True
+    return False
+
+
+def _walk(seq):
+    """Все узлы дерева разбора"""
+    for node in seq:
+        yield node
+        op, arg = node
+        if op in _REPEATS:
+            yield from _walk(arg[2])
+        elif op == sre_constants.SUBPATTERN:
+            yield from _walk(arg[-1])
+        elif op == sre_constants.BRANCH:
+            for branch in arg[1]:
+                yield from _walk(branch)
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            yield from _walk(arg[1])
+        elif op == getattr(sre_constants, "ATOMIC_GROUP", None):
+            yield from _walk(arg)
+        elif op == getattr(sre_constants, "GROUPREF_EXISTS", None):
+            yield from _walk(arg[1])
+            if arg[2]:
+                yield from _walk(arg[2])
+
+
+def _arrow_pattern(pattern: str, parsed) -> Optional[dict]:
+    """Эквивалент для pyarrow (RE2) или None, если семантика может разойтись"""
+
+    # {,n} и [[:alpha:]] оба движка принимают, но понимают по-разному
+    if not pattern.isascii() or "{," in pattern or "[:" in pattern:
+        return None
+
+    needs_ascii = bool(parsed.state.flags & _UNICODE_FLAGS)
+    needs_single_line = False
+    for op, arg in _walk(parsed):
+        if op in _PYTHON_ONLY:
+            return None
+        if op == sre_constants.IN and any(item_op == sre_constants.CATEGORY for item_op, _ in arg):
+            needs_ascii = True
+        elif op == sre_constants.AT:
+            if arg in (sre_constants.AT_BOUNDARY, sre_constants.AT_NON_BOUNDARY):
+                needs_ascii = True
+            elif arg == sre_constants.AT_END:
+                needs_single_line = True  # $ в Python совпадает и перед последним \n
+        elif op == sre_constants.SUBPATTERN and (arg[1] | arg[2]) & _UNICODE_FLAGS:
+            needs_ascii = True
+
+    return {
+        # re.match привязан к началу строки, match_substring_regex ищет в любом месте
+        "pattern": f"^(?:{pattern})",
+        "needs_ascii": needs_ascii,
+        "needs_single_line": needs_single_line,
+    }
+
+
+@lru_cache(maxsize=1024)
+def analyze_pattern(pattern: str) -> dict:
+    """Разбор шаблона один раз на процесс: скомпилированный re, проблема (или None)
+    и вариант для pyarrow"""
+
+    if len(pattern) > MAX_PATTERN_LENGTH:
+        return {"compiled": None, "arrow": None,
+                "problem": f"Regex pattern is longer than {MAX_PATTERN_LENGTH} characters"}
+    try:
+        compiled = re.compile(pattern)
+        parsed = sre_parse.parse(pattern)
+    except (re.error, RecursionError, OverflowError) as e:
+        return {"compiled": None, "arrow": None, "problem": f"Invalid regex pattern: {e}"}
+
+    probe = sorted(set(_PROBE_CHARS) | set(pattern))
+    for op, arg in _walk(parsed):
+        if op in _REPEATS and arg[1] > 1 and _ambiguous(arg[2], _first_seq(arg[2], probe)[0], probe):
+            return {"compiled": None, "arrow": None,
+                    "problem": "Regex pattern may cause catastrophic backtracking (nested or overlapping repetition)"}
+
+    return {"compiled": compiled, "arrow": _arrow_pattern(pattern, parsed), "problem": None}
+
+
+def pattern_problem(pattern) -> Optional[str]:
+    """Почему шаблон нельзя использовать в правиле, или None"""
+    if not isinstance(pattern, str):
+        return "Regex pattern must be a string"
+    return analyze_pattern(pattern)["problem"]
+
+
+def match_values(pattern: str, values) -> np.ndarray:
+    """re.match по каждому значению (Python-путь)"""
+    compiled = analyze_pattern(pattern)["compiled"] or re.compile(pattern)
+    return np.fromiter((compiled.match(value) is not None for value in values), dtype=bool, count=len(values))
+
+
+def to_arrow_strings(series: pd.Series) -> Optional[pa.Array]:
+    """Колонка как строки Arrow, если её текст совпадает с astype(str); иначе None
+
+    Подходят строковые колонки (пропуски станут null) и целые числа —
+    str(int) и приведение Arrow к строке дают одно и то же.
+    """
+
+    if pd.api.types.is_integer_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return pc.cast(pa.array(series.to_numpy()), pa.string())
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return None
+    try:
+        array = pa.array(series, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return None
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    if array.type == pa.large_string():
+        array = array.cast(pa.string())
+    return array if array.type == pa.string() else None
+
+
+def arrow_traits(array: pa.Array) -> dict:
+    """Свойства данных, от которых зависит, совпадёт ли RE2 с Python (считаются раз на колонку)"""
+
+    return {
+        # \s в Python шире, чем в RE2, на управляющих символах \x0b и \x1c-\x1f
+        "ascii": pc.all(pc.string_is_ascii(array)).as_py() is not False
+                 and not pc.any(pc.match_substring_regex(array, "[\\x0b\\x1c-\\x1f]")).as_py(),
+        "single_line": not pc.any(pc.match_substring(array, "\n")).as_py(),
+    }
+
+
+def match_arrow(pattern: str, array: pa.Array, traits: dict) -> Optional[np.ndarray]:
+    """re.match через pyarrow; None — если на этих данных результат может отличаться
+    от Python. Null остаются False: их текст проверяет вызывающий"""
+
+    arrow = analyze_pattern(pattern)["arrow"]
+    if arrow is None:
+        return None
+    if arrow["needs_ascii"] and not traits["ascii"]:
+        return None
+    if arrow["needs_single_line"] and not traits["single_line"]:
+        return None
+
+    try:
+        matched = pc.match_substring_regex(array, arrow["pattern"])
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        return None
+    return matched.fill_null(False).to_numpy(zero_copy_only=False)
@@ -32,7 +32,7 @@ class QualityProfileResponse(BaseModel):
 
 class ValidationRuleCreate(BaseModel):
     column_name: str
-    rule_type: str  # not_null, range, unique, regex
+    rule_type: str  # not_null, range, unique, regex, in_set, min_length, max_length, compare
     parameters: Optional[Dict[str, Any]] = {}
 
 
@@ -1,13 +1,24 @@
 import re
 import os
+import codecs
 import hashlib
 from pathlib import Path
 
+import numpy as np
+
 # ── Разрешённые MIME типы ─────────────────────────────────────────────────────
 ALLOWED_EXTENSIONS = {".csv"}
 MAX_FILE_SIZE_MB = 100
 MAX_FILE_SIZE = MAX_FILE_SIZE_MB * 1024 * 1024
 
+# ── Разбор CSV на уровне байтов ──────────────────────────────────────────────
+DELIMITER_CANDIDATES = b",;\t|"
+QUOTE_BYTE = ord('"')
+NEWLINE_BYTE = ord("\n")
+WHITESPACE_BYTES = np.frombuffer(b" \t\r", dtype=np.uint8)
+MAX_HEADER_BYTES = 1024 * 1024
+SCAN_CHUNK_SIZE = 1024 * 1024
+
 # ── Опасные паттерны в CSV (инъекции) ────────────────────────────────────────
 DANGEROUS_PATTERNS = [
     r"^=",  # Excel formula injection
@@ -18,6 +29,78 @@ DANGEROUS_PATTERNS = [
     r"javascript:",
 ]
 
+# Реально опасные значения в начале ячейки, одним выражением:
+# =CMD(...), =SUM(...) — Excel инъекции
+# +cmd|'/C calc' — command injection
+# @SUM(...) — формулы
+# javascript:, <script — XSS
+DANGEROUS_CELL = re.compile(rb"[ \t\r\x0b\x0c]*\"*'*(?:=\w+\(|\+cmd\||@\w+\(|(?i:javascript:|<script))")
+CELL_PREFIX_BYTES = np.frombuffer(b" \t\r\x0b\x0c\"'", dtype=np.uint8)
+# Таблица "байт может стоять перед паттерном" — быстрее np.isin по всему чанку
+_CELL_PREFIX_TABLE = np.zeros(256, dtype=bool)
+_CELL_PREFIX_TABLE[CELL_PREFIX_BYTES] = True
+CELL_TRIGGER_BYTES = np.frombuffer(b"=+@jJ<", dtype=np.uint8)
+SCAN_MAX_ISSUES = int(os.getenv("SCAN_MAX_ISSUES", 10))
+# Строка длиннее лимита не сканируется: хвост без \n не копится бесконечно
+SCAN_MAX_LINE_BYTES = int(os.getenv("SCAN_MAX_LINE_BYTES", 1024 * 1024))
+
+
+def separator_table(delimiters: bytes) -> np.ndarray:
+    """Таблица байтов, после которых начинается новое поле: разделители и \n"""
+    table = np.zeros(256, dtype=bool)
+    table[np.frombuffer(delimiters, dtype=np.uint8)] = True
+    table[NEWLINE_BYTE] = True
+    return table
+
+
+# Пока разделитель не известен, поле может начаться после любого из кандидатов
+ANY_SEPARATOR = separator_table(DELIMITER_CANDIDATES)
+
+
+def _outside_quotes(arr: np.ndarray, in_quotes: bool, separators: np.ndarray = ANY_SEPARATOR,
+                    field_start: bool = True) -> np.ndarray:
+    """Маска байтов вне кавычек — по тем же правилам, что у pd.read_csv
+
+    Кавычка открывает поле, только если она первая в поле (field_start — для
+    начала arr, дальше — после байта из separators); кавычка в середине поля —
+    обычный символ. Внутри поля "" — экранированная кавычка, одиночная
+    закрывает поле. Считается по сериям подряд идущих кавычек: нечётная серия
+    в начале поля открывает его (а внутри поля закрывает), нечётная серия в
+    середине поля всегда оставляет нас вне кавычек, чётные ничего не меняют.
+    Серия, которая может продолжиться в следующем чанке, должна прийти целиком.
+    """
+
+    quotes = np.flatnonzero(arr == QUOTE_BYTE)
+    if quotes.size == 0:
+        return np.full(arr.size, not in_quotes)
+
+    first = np.append(True, np.diff(quotes) != 1)
+    starts = quotes[first]
+    odd = np.diff(np.append(np.flatnonzero(first), quotes.size)) % 2 == 1
+    at_field_start = separators[arr[np.maximum(starts - 1, 0)]]
+    if starts[0] == 0:
+        at_field_start[0] = field_start
+
+    swap = odd & at_field_start
+    reset = odd & ~at_field_start
+    swaps = np.cumsum(swap)
+    last_reset = np.maximum.accumulate(np.where(reset, np.arange(starts.size), -1))
+    since_reset = swaps - np.where(last_reset >= 0, swaps[last_reset], 0)
+    inside_after = np.where(last_reset >= 0, False, in_quotes) ^ (since_reset % 2 == 1)
+
+    segments = np.diff(np.concatenate(([0], starts, [arr.size])))
+    inside = np.repeat(np.concatenate(([in_quotes], inside_after)), segments)
+    return ~inside
+
+
+def sniff_delimiter(header: bytes) -> str:
+    """Разделитель — самый частый из кандидатов вне кавычек в заголовке"""
+    arr = np.frombuffer(header, dtype=np.uint8)
+    outside = _outside_quotes(arr, False)
+    counts = [int(np.count_nonzero((arr == c) & outside)) for c in DELIMITER_CANDIDATES]
+    best = int(np.argmax(counts))
+    return chr(DELIMITER_CANDIDATES[best]) if counts[best] > 0 else ","
+
 
 def validate_file_extension(filename: str) -> bool:
     """Проверяем расширение файла"""
@@ -43,49 +126,139 @@ def sanitize_filename(filename: str) -> str:
     return f"{name[:100]}{ext}"
 
 
-def scan_csv_content(content: bytes) -> dict:
+class CsvContentScanner:
+    """Инкрементальный сканер опасных паттернов: принимает CSV по чанкам
+
+    Проверяется весь файл, а не только первые строки. Начала ячеек ищутся
+    векторно по сырым байтам (numpy), и одно предкомпилированное выражение
+    DANGEROUS_CELL применяется только к ячейкам, которые начинаются с
+    первого символа одного из паттернов — без декодирования и split().
+    """
+
+    def __init__(self, max_issues: int = SCAN_MAX_ISSUES, max_line_bytes: int = SCAN_MAX_LINE_BYTES):
+        self.max_issues = max_issues
+        self.max_line_bytes = max_line_bytes
+        self.issues = []
+        self.total = 0
+        self.delimiter = None
+        self.stopped = False  # встретилась слишком длинная строка — дальше не сканируем
+        self._line = 1  # физическая строка начала необработанного хвоста
+        self._tail = b""
+
+    def feed(self, chunk) -> None:
+        if self.stopped:
+            return
+
+        data = self._tail + bytes(chunk)
+        end = data.rfind(b"\n")
+        if end == -1:
+            if len(data) > self.max_line_bytes:
+                self._reject_line(data)
+                return
+            self._tail = data
+            return
+
+        self._tail = data[end + 1:]
+        self._scan(data, end + 1)
+
+    def _reject_line(self, data: bytes) -> None:
+        """Строку без \n длиннее лимита считаем подозрительной и прекращаем сканирование"""
+        self.stopped = True
+        self._tail = b""
+        self.total += 1
+        if len(self.issues) < self.max_issues:
+            self.issues.append({
+                "line": self._line,
+                "cell": None,
+                "value": data[:50].decode("utf-8", errors="replace"),
+                "reason": f"line is longer than {self.max_line_bytes} bytes and was not scanned"
+            })
+
+    def _scan(self, data: bytes, end: int) -> None:
+        start = 0
+        if self.delimiter is None:
+            # Пропускаем заголовок, по нему же определяем разделитель
+            header_end = data.find(b"\n", 0, end)
+            if header_end == -1:
+                header_end = end
+            self.delimiter = sniff_delimiter(data[:header_end])
+            start = min(header_end + 1, end)
+            self._line += 1
+
+        delim = self.delimiter.encode()
+        arr = np.frombuffer(data, dtype=np.uint8, count=end)
+
+        # Начала ячеек: позиция start и всё, что идёт после разделителя или \n
+        bounds = np.flatnonzero((arr == ord(delim)) | (arr == NEWLINE_BYTE)) + 1
+        cells = np.concatenate(([start], bounds[(bounds > start) & (bounds < end)]))
+        cells = cells[cells < end]
+
+        # Векторно пропускаем пробелы и кавычки в начале ячейки, сколько бы их
+        # ни было: для ячейки, начинающейся с такого байта, берём конец его
+        # серии подряд идущих байтов из CELL_PREFIX_BYTES (разделитель серию
+        # обрывает, даже если это \t). Остаются только ячейки, которые
+        # начинаются с первого символа опасного паттерна
+        prefix = _CELL_PREFIX_TABLE[arr]
+        prefix[arr == ord(delim)] = False
+        pos = cells
+        skipped = prefix[cells]
+        if skipped.any():
+            runs = np.flatnonzero(prefix)
+            run_last = np.flatnonzero(np.append(np.diff(runs) != 1, True))
+            inside = np.searchsorted(runs, cells[skipped])
+            pos = cells.copy()
+            pos[skipped] = runs[run_last[np.searchsorted(run_last, inside)]] + 1
+            keep = pos < end
+            cells, pos = cells[keep], pos[keep]
+        candidates = cells[np.isin(arr[pos], CELL_TRIGGER_BYTES)]
+
+        line = self._line
+        last = start
+        for cell_start in candidates.tolist():
+            match = DANGEROUS_CELL.match(data, cell_start, end)
+            if not match or data.find(delim, cell_start, match.end()) != -1:
+                continue
+
+            line += data.count(b"\n", last, cell_start)
+            last = cell_start
+            self.total += 1
+            if len(self.issues) < self.max_issues:
+                line_start = data.rfind(b"\n", 0, cell_start) + 1
+                cell_end = data.find(delim, cell_start, end)
+                line_end = data.find(b"\n", cell_start, end)
+                if cell_end == -1 or line_end < cell_end:
+                    cell_end = line_end
+                cell = data[cell_start:cell_end].decode("utf-8", errors="replace")
+                self.issues.append({
+                    "line": line,
+                    "cell": data.count(delim, line_start, cell_start) + 1,
+                    "value": cell.strip().strip('"').strip("'")[:50]
+                })
+
+        self._line = line + data.count(b"\n", last, end)
+
+    def result(self) -> dict:
+        # Хвост без завершающего \n — последняя строка файла
+        if self._tail:
+            tail = self._tail + b"\n"
+            self._tail = b""
+            self._scan(tail, len(tail))
+
+        return {
+            "safe": self.total == 0,
+            "issues": self.issues,
+            "message": "File is safe" if not self.total else f"Found {self.total} suspicious patterns"
+        }
+
+
+def scan_csv_content(content, max_issues: int = SCAN_MAX_ISSUES) -> dict:
     """Сканируем содержимое CSV на опасные паттерны"""
 
-    issues = []
-
-    try:
-        text = content.decode("utf-8", errors="replace")
-        lines = text.split("\n")[:100]
-
-        # Пропускаем заголовок
-        for line_num, line in enumerate(lines[1:], 2):
-            cells = line.split(",")
-            for cell_num, cell in enumerate(cells, 1):
-                cell = cell.strip().strip('"').strip("'")
-
-                # Только реально опасные паттерны:
-                # =CMD(...), =SUM(...) — Excel инъекции
-                # +cmd|'/C calc' — command injection
-                # @SUM(...) — формулы
-                # javascript: — XSS
-                # <script — XSS
-                dangerous = (
-                        re.match(r'^=\w+\(', cell) or  # =SUM( =CMD(
-                        re.match(r'^\+cmd\|', cell) or  # +cmd|'/C calc'
-                        re.match(r'^@\w+\(', cell) or  # @SUM(
-                        re.match(r'(?i)^javascript:', cell) or  # javascript:
-                        re.match(r'(?i)^<script', cell)  # <script
-                )
-
-                if dangerous:
-                    issues.append({
-                        "line": line_num,
-                        "cell": cell_num,
-                        "value": cell[:50]
-                    })
-    except Exception:
-        pass
-
-    return {
-        "safe": len(issues) == 0,
-        "issues": issues[:10],
-        "message": "File is safe" if not issues else f"Found {len(issues)} suspicious patterns"
-    }
+    scanner = CsvContentScanner(max_issues)
+    view = memoryview(content)
+    for start in range(0, len(view), SCAN_CHUNK_SIZE):
+        scanner.feed(view[start:start + SCAN_CHUNK_SIZE])
+    return scanner.result()
 
 
 def compute_file_hash(content: bytes) -> str:
@@ -93,32 +266,266 @@ def compute_file_hash(content: bytes) -> str:
     return hashlib.sha256(content).hexdigest()
 
 
-def validate_csv_structure(content: bytes) -> dict:
-    """Базовая проверка структуры CSV"""
+class CsvStructureValidator:
+    """Инкрементальная проверка структуры CSV на уровне байтов
 
-    try:
-        text = content.decode("utf-8", errors="replace")
-        lines = [l for l in text.split("\n") if l.strip()]
+    Работает по чанкам (bytes, memoryview, mmap) без декодирования в str и без
+    разбиения на строки: кавычки, переводы строк и разделители ищутся
+    векторно через numpy. Учитывает кавычки по RFC 4180 — перевод строки
+    или разделитель внутри "..." не считаются границей записи/поля.
+    Пустые (и состоящие из пробелов) строки пропускаются, как в pd.read_csv.
+    """
 
-        if len(lines) < 2:
-            return {"valid": False, "reason": "CSV must have at least a header and one data row"}
+    def __init__(self, max_examples: int = 10):
+        self.max_examples = max_examples
+        self.delimiter = None
+        self.columns = 0
+        self.rows = 0
+        self.ragged_rows = 0
+        self.extra_field_rows = 0
+        self.first_extra_field = None  # {"line", "fields"} первой записи с лишними полями
+        self.ragged_examples = []
 
-        # Проверяем заголовок
-        header = lines[0].split(",")
-        if len(header) < 1:
-            return {"valid": False, "reason": "CSV must have at least one column"}
+        self._head = bytearray()  # буфер до конца заголовка
+        self._in_quotes = False
+        self._separators = None  # separator_table(delimiter)
+        self._field_start = True  # следующий байт — первый в поле
+        self._quote_tail = b""  # кавычки в конце чанка: серия может продолжиться
+        self._pending_delims = 0  # разделители незавершённой записи
+        self._pending_chars = 0  # непробельные байты незавершённой записи
+        self._line = 1  # физическая строка, с которой начинается текущий чанк
+        self._record_line = 1  # физическая строка начала незавершённой записи
+        self._error = None
 
-        if len(header) > 500:
-            return {"valid": False, "reason": "Too many columns (max 500)"}
+        # Кодировка: проверяем UTF-8 инкрементально, без хранения текста
+        self._prefix = b""
+        self._bom = False
+        self._decoder = codecs.getincrementaldecoder("utf-8")("strict")
+        self._utf8_ok = True
+        self._cp1251_ok = True
 
-        if len(lines) > 1_000_000:
-            return {"valid": False, "reason": "Too many rows (max 1,000,000)"}
+    def feed(self, chunk) -> None:
+        if self._error:
+            return
 
-        return {
-            "valid": True,
-            "columns": len(header),
-            "rows": len(lines) - 1
-        }
+        self._check_encoding(chunk)
+        if self._error:
+            return
+
+        if self.delimiter is not None:
+            self._scan(chunk)
+            return
+
+        # Копим начало файла, пока не встретим конец заголовка
+        self._head += chunk
+        header_start, header_end = self._find_header(self._head)
+        if header_end is None:
+            if len(self._head) > MAX_HEADER_BYTES:
+                self._error = "Header row is too long or the file has no line breaks"
+            return
+
+        head = bytes(self._head)
+        self._head = bytearray()
+        self._line += head.count(b"\n", 0, header_end) - head.count(b"\n", header_start, header_end)
+        header = head[header_start:header_end]
+        self.delimiter = sniff_delimiter(header)
+        self.columns = self._count_fields(header, self.delimiter)
+        self._separators = separator_table(self.delimiter.encode())
+        self._line += header.count(b"\n") + 1
+        self._record_line = self._line
+        self._scan(memoryview(head)[header_end + 1:])
+
+    def _check_encoding(self, chunk) -> None:
+        # BOM может прийти по частям, если первые чанки совсем короткие
+        if len(self._prefix) < 4:
+            self._prefix += bytes(chunk[:4 - len(self._prefix)])
+            if self._prefix.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+                self._error = "UTF-16 encoded files are not supported, save the file as UTF-8"
+                return
+            self._bom = self._prefix.startswith(codecs.BOM_UTF8)
+
+        arr = np.frombuffer(chunk, dtype=np.uint8)
+        if self._cp1251_ok and (arr == 0x98).any():
+            # Единственный байт, не определённый в cp1251
+            self._cp1251_ok = False
+
+        if not self._utf8_ok:
+            return
+        # Быстрый путь: чистый ASCII без незавершённой последовательности
+        if not self._decoder.getstate()[0] and not (arr & 0x80).any():
+            return
+        try:
+            self._decoder.decode(chunk)
+        except UnicodeDecodeError:
+            self._utf8_ok = False
+
+    def _find_header(self, buf) -> tuple:
+        """Границы первой непустой записи (начало, позиция \\n) или (0, None)"""
+        arr = np.frombuffer(buf, dtype=np.uint8)
+        outside = _outside_quotes(arr, False)
+        start = 0
+        for end in np.flatnonzero((arr == NEWLINE_BYTE) & outside):
+            # Пустые строки до заголовка pandas тоже пропускает
+            if bytes(buf[start:end]).strip():
+                return start, int(end)
+            start = end + 1
+        return 0, None
+
+    @classmethod
+    def _count_fields(cls, record: bytes, delimiter: str) -> int:
+        arr = np.frombuffer(record, dtype=np.uint8)
+        outside = _outside_quotes(arr, False, separator_table(delimiter.encode()))
+        return int(np.count_nonzero((arr == ord(delimiter)) & outside)) + 1
+
+    def _scan(self, chunk) -> None:
+        arr = np.frombuffer(chunk, dtype=np.uint8)
+        if self._quote_tail:
+            arr = np.concatenate((np.frombuffer(self._quote_tail, dtype=np.uint8), arr))
+            self._quote_tail = b""
+
+        # Серия кавычек на конце чанка может продолжиться в следующем — откладываем её
+        tail = arr.size
+        while tail and arr[tail - 1] == QUOTE_BYTE:
+            tail -= 1
+        if tail < arr.size:
+            self._quote_tail = arr[tail:].tobytes()
+            arr = arr[:tail]
+        if arr.size == 0:
+            return
+
+        is_newline = arr == NEWLINE_BYTE
+        is_delim = arr == ord(self.delimiter)
+        if self._in_quotes or (arr == QUOTE_BYTE).any():
+            outside = _outside_quotes(arr, self._in_quotes, self._separators, self._field_start)
+            ends = np.flatnonzero(is_newline & outside)
+            delim_pos = np.flatnonzero(is_delim & outside)
+            self._in_quotes = not bool(outside[-1])
+        else:
+            # Быстрый путь: в чанке нет кавычек
+            ends = np.flatnonzero(is_newline)
+            delim_pos = np.flatnonzero(is_delim)
+        blank_pos = np.flatnonzero(is_newline | np.isin(arr, WHITESPACE_BYTES))
+
+        if ends.size:
+            # Поля и непробельные байты каждой завершённой записи:
+            # позиции считаются через searchsorted, без cumsum по всему чанку
+            delims_before = np.searchsorted(delim_pos, ends)
+            chars_before = (ends + 1) - np.searchsorted(blank_pos, ends, side="right")
+            rec_delims = np.diff(delims_before, prepend=0)
+            rec_chars = np.diff(chars_before, prepend=0)
+            rec_delims[0] += self._pending_delims
+            rec_chars[0] += self._pending_chars
+
+            non_blank = rec_chars > 0
+            fields = rec_delims + 1
+            self.rows += int(np.count_nonzero(non_blank))
+
+            ragged = non_blank & (fields != self.columns)
+            if ragged.any():
+                self._record_ragged(np.flatnonzero(ragged), ends, fields, is_newline)
+
+            self._pending_delims = int(delim_pos.size - delims_before[-1])
+            self._pending_chars = int(arr.size - blank_pos.size - chars_before[-1])
+            self._record_line = self._line + int(np.count_nonzero(is_newline[:ends[-1] + 1]))
+        else:
+            self._pending_delims += int(delim_pos.size)
+            self._pending_chars += int(arr.size - blank_pos.size)
+
+        self._line += int(np.count_nonzero(is_newline))
+        self._field_start = bool(self._separators[arr[-1]])
+
+    def _record_ragged(self, indices, ends, fields, is_newline) -> None:
+        extra = fields[indices] > self.columns
+        self.ragged_rows += int(indices.size)
+        self.extra_field_rows += int(np.count_nonzero(extra))
+
+        def line_of(i) -> int:
+            if i == 0:
+                return self._record_line
+            return self._line + int(np.count_nonzero(is_newline[:ends[i - 1] + 1]))
+
+        # Запоминаем отдельно: примеров не больше max_examples, и все они могут быть короткими строками
+        if self.first_extra_field is None and extra.any():
+            i = indices[np.argmax(extra)]
+            self.first_extra_field = {"line": line_of(i), "fields": int(fields[i])}
+
+        for i in indices[:max(0, self.max_examples - len(self.ragged_examples))]:
+            self.ragged_examples.append({"line": line_of(i), "fields": int(fields[i])})
+
+    @property
+    def failed(self) -> bool:
+        """Проверка уже провалена — следующие чанки можно не передавать"""
+        return self._error is not None
+
+    @property
+    def encoding(self) -> str:
+        if self._utf8_ok:
+            return "utf-8-sig" if self._bom else "utf-8"
+        return "cp1251" if self._cp1251_ok else "latin-1"
+
+    def result(self) -> dict:
+        try:
+            if self._error:
+                return {"valid": False, "reason": self._error}
+
+            if self.delimiter is None and self._head.strip():
+                # Файл из одной строки без завершающего \n
+                self.feed(b"\n")
+
+            if self._pending_chars > 0 or self._quote_tail:
+                self._scan(b"\n")
+                self._pending_chars = 0
+
+            if self._utf8_ok:
+                try:
+                    self._decoder.decode(b"", final=True)
+                except UnicodeDecodeError:
+                    self._utf8_ok = False
+
+            if self._in_quotes:
+                return {
+                    "valid": False,
+                    "reason": f"Unterminated quoted field starting at line {self._record_line}"
+                }
+
+            if self.delimiter is None or self.rows < 1:
+                return {"valid": False, "reason": "CSV must have at least a header and one data row"}
+
+            if self.columns > 500:
+                return {"valid": False, "reason": "Too many columns (max 500)"}
+
+            if self.rows > 1_000_000:
+                return {"valid": False, "reason": "Too many rows (max 1,000,000)"}
+
+            if self.extra_field_rows:
+                first = self.first_extra_field
+                return {
+                    "valid": False,
+                    "reason": (
+                        f"{self.extra_field_rows} row(s) have more fields than the header "
+                        f"(line {first['line']}: {first['fields']} fields, expected {self.columns})"
+                    )
+                }
+
+            return {
+                "valid": True,
+                "columns": self.columns,
+                "rows": self.rows,
+                "delimiter": self.delimiter,
+                "encoding": self.encoding,
+                "ragged_rows": self.ragged_rows,
+                "ragged_examples": self.ragged_examples
+            }
+
+        except Exception as e:
+            return {"valid": False, "reason": str(e)}
+
+
+def validate_csv_structure(content) -> dict:
+    """Базовая проверка структуры CSV (bytes, memoryview или mmap)"""
 
-    except Exception as e:
-        return {"valid": False, "reason": str(e)}
\ No newline at end of file
+    validator = CsvStructureValidator()
+    view = memoryview(content)
+    for start in range(0, len(view), SCAN_CHUNK_SIZE):
+        validator.feed(view[start:start + SCAN_CHUNK_SIZE])
+    return validator.result()
@@ -0,0 +1,244 @@
+import os
+import tempfile
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from sqlalchemy.orm import Session
+
+from . import models
+from .cache import dataframe_cache
+
+# Директория для загрузок
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "/data/uploads"))
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+
+# Строк в row group Parquet: read_rows декодирует только группы с нужными строками
+PARQUET_ROW_GROUP_ROWS = int(os.getenv("PARQUET_ROW_GROUP_ROWS", 64 * 1024))
+
+# Контентно-адресуемое хранилище: один файл на каждый уникальный SHA256
+BLOB_DIR = UPLOAD_DIR / "blobs"
+
+
+def blob_path(content_hash: str) -> Path:
+    """Путь к блобу: blobs/ab/abcdef....csv"""
+    return BLOB_DIR / content_hash[:2] / f"{content_hash}.csv"
+
+
+def store_blob(tmp_path: Path, content_hash: str) -> Path:
+    """Кладём временный файл в хранилище; если такой блоб уже есть — просто удаляем копию"""
+
+    path = blob_path(content_hash)
+    if path.exists():
+        tmp_path.unlink(missing_ok=True)
+        return path
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_csv(dataset: models.Dataset, **kwargs) -> pd.DataFrame:
+    """Читаем CSV датасета с разделителем и кодировкой, найденными при загрузке"""
+    return pd.read_csv(
+        dataset.file_path,
+        sep=dataset.delimiter or ",",
+        encoding=dataset.encoding or "utf-8",
+        **kwargs
+    )
+
+
+def columnar_path(dataset: models.Dataset) -> Path:
+    """Parquet-копия лежит рядом с CSV: <hash>.parquet"""
+    return Path(dataset.file_path).with_suffix(".parquet")
+
+
+def no_columnar_path(dataset: models.Dataset) -> Path:
+    """Метка <hash>.no-parquet: конвертация уже не удалась, читаем CSV"""
+    return Path(dataset.file_path).with_suffix(".no-parquet")
+
+
+def ensure_columnar(dataset: models.Dataset) -> Optional[Path]:
+    """Один раз конвертируем CSV в типизированный Parquet; None, если не получилось
+
+    Неудача запоминается меткой no_columnar_path — следующие вызовы сразу
+    возвращают None, а не читают весь CSV ради повторной попытки.
+    """
+
+    path = columnar_path(dataset)
+    if path.exists():
+        return path
+    marker = no_columnar_path(dataset)
+    if marker.exists():
+        return None
+
+    try:
+        # low_memory=False: тип колонки выводится по всему файлу, а не по кускам,
+        # иначе в одной колонке смешиваются int и str и Arrow их не примет
+        df = read_csv(dataset, low_memory=False)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".parquet.part")
+        os.close(fd)
+        try:
+            df.to_parquet(tmp_name, index=False, row_group_size=PARQUET_ROW_GROUP_ROWS)
+            # Parquet должен читаться в тот же DataFrame, что и CSV, — иначе
+            # результаты правил зависели бы от того, готова ли уже копия
+            if not arrow_to_pandas(pq.read_table(tmp_name)).equals(df):
+                raise ValueError("Parquet copy does not match the CSV")
+            os.replace(tmp_name, path)
+        finally:
+            Path(tmp_name).unlink(missing_ok=True)
+    except Exception:
+        try:
+            marker.touch()
+        except OSError:
+            pass
+        return None
+
+    return path
+
+
+def cache_token(dataset: models.Dataset) -> str:
+    """Версия содержимого для ключа кэша: хеш, а для старых записей — mtime файла"""
+    if dataset.content_hash:
+        return dataset.content_hash
+    try:
+        return str(os.stat(dataset.file_path).st_mtime_ns)
+    except OSError:
+        return ""
+
+
+def arrow_to_pandas(data) -> pd.DataFrame:
+    """Таблица или батч Arrow как DataFrame, прочитанный из CSV
+
+    Arrow отдаёт пропуски в текстовых колонках как None, а read_csv — как NaN.
+    Правила и diff делают astype(str), так что None превратился бы в "None"
+    вместо "nan" и результат зависел бы от того, готов ли уже Parquet.
+    """
+
+    df = data.to_pandas()
+    for name, column in zip(data.schema.names, data.columns):
+        if column.null_count and df[name].dtype == object:
+            df[name] = df[name].where(df[name].notna(), np.nan)
+    return df
+
+
+def load_dataframe(dataset: models.Dataset, columns: Optional[list] = None) -> pd.DataFrame:
+    """Загружаем датасет: сначала LRU-кэш процесса, затем Parquet (с проекцией колонок), CSV — запасной путь"""
+
+    token = cache_token(dataset)
+    df = dataframe_cache.get(dataset.id, token, columns)
+    if df is not None:
+        return df
+
+    path = ensure_columnar(dataset)
+    if path is None:
+        df = read_csv(dataset, usecols=columns)
+    else:
+        df = arrow_to_pandas(pq.read_table(path, columns=columns))
+
+    dataframe_cache.put(dataset.id, token, df, columns)
+    return df
+
+
+def iter_chunks(dataset: models.Dataset, chunk_rows: int, text_columns: Optional[list] = None) -> Iterator[pd.DataFrame]:
+    """Читаем датасет по chunk_rows строк, не загружая его целиком: Parquet, если он есть, иначе CSV
+
+    text_columns читаются из CSV как строки — у Parquet типы и так одинаковы во всех чанках.
+    """
+
+    path = columnar_path(dataset)
+    if path.exists():
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield arrow_to_pandas(batch)
+    else:
+        dtype = {col: str for col in text_columns or []}
+        with read_csv(dataset, chunksize=chunk_rows, dtype=dtype) as reader:
+            yield from reader
+
+
+def read_rows(dataset: models.Dataset, positions, chunk_rows: int = 200_000) -> pd.DataFrame:
+    """Строки по позициям (отсортированным), с позициями в индексе — без загрузки всего файла
+
+    Если DataFrame уже в кэше — берём из него. Из Parquet читаются только
+    row group с нужными строками (типы в нём общие для всего файла), а внутри
+    группы — батчами до последней нужной строки: в файлах, записанных до
+    PARQUET_ROW_GROUP_ROWS, группа может занимать весь файл. CSV — чанками
+    до последней нужной строки.
+    """
+
+    positions = np.asarray(positions, dtype=np.int64)
+
+    df = dataframe_cache.get(dataset.id, cache_token(dataset))
+    if df is not None:
+        return df.iloc[positions]
+
+    parts = []
+    path = columnar_path(dataset)
+    if path.exists():
+        parquet = pq.ParquetFile(path)
+        meta = parquet.metadata
+        ends = np.cumsum([meta.row_group(g).num_rows for g in range(meta.num_row_groups)])
+        for group in np.unique(np.searchsorted(ends, positions, side="right")):
+            start = int(ends[group - 1]) if group else 0
+            wanted = positions[(positions >= start) & (positions < ends[group])]
+            batches = parquet.iter_batches(batch_size=PARQUET_ROW_GROUP_ROWS, row_groups=[int(group)])
+            for batch in batches:
+                end = start + batch.num_rows
+                if wanted[0] < end:
+                    chunk = arrow_to_pandas(batch)
+                    chunk.index = pd.RangeIndex(start, end)
+                    parts.append(chunk.loc[wanted[wanted < end]])
+                    wanted = wanted[wanted >= end]
+                if not len(wanted):
+                    break
+                start = end
+        return pd.concat(parts) if parts else parquet.schema_arrow.empty_table().to_pandas()
+
+    last = int(positions[-1]) if len(positions) else -1
+    offset = 0
+    with read_csv(dataset, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            if offset > last:
+                break
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            parts.append(chunk.loc[positions[(positions >= offset) & (positions < offset + len(chunk))]])
+            offset += len(chunk)
+    return pd.concat(parts) if parts else read_csv(dataset, nrows=0)
+
+
+def dataset_columns(dataset: models.Dataset) -> list:
+    """Имена колонок без чтения данных — из схемы Parquet"""
+
+    path = ensure_columnar(dataset)
+    if path is None:
+        return list(read_csv(dataset, nrows=0).columns)
+    return pq.read_schema(path).names
+
+
+def find_by_hash(db: Session, content_hash: str, root_only: bool = False):
+    """Первый датасет с таким же содержимым"""
+
+    query = db.query(models.Dataset).filter(models.Dataset.content_hash == content_hash)
+    if root_only:
+        query = query.filter(models.Dataset.parent_id.is_(None))
+    return query.order_by(models.Dataset.id).first()
+
+
+def release_file(db: Session, dataset: models.Dataset) -> None:
+    """Удаляем файл датасета с диска, только если на него больше никто не ссылается"""
+
+    shared = db.query(models.Dataset.id).filter(
+        models.Dataset.file_path == dataset.file_path,
+        models.Dataset.id != dataset.id
+    ).first()
+    if shared:
+        return
+
+    for path in (dataset.file_path, columnar_path(dataset), no_columnar_path(dataset)):
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except Exception:
+                pass  # Если файл не удалился — не критично
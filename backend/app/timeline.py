@@ -0,0 +1,145 @@
+import os
+
+from joblib import Parallel, delayed
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+from .storage import cache_token, load_dataframe
+from .jobs import find_cached_profile
+from .model_registry import root_id_of
+from .comparator import compare_stats, column_stats, profile_stats, calculate_drift_score
+
+# Сколько версий без профиля читается одновременно при построении ленты
+TIMELINE_WORKERS = int(os.getenv("TIMELINE_WORKERS", os.cpu_count() or 1))
+
+
+def version_chain(db: Session, dataset: models.Dataset) -> list:
+    """Все версии цепочки датасета (корень и его потомки) по номеру версии"""
+
+    root_id = root_id_of(dataset)
+    return db.query(models.Dataset).filter(
+        (models.Dataset.id == root_id) |
+        (models.Dataset.parent_id == root_id)
+    ).order_by(models.Dataset.version).all()
+
+
+def profile_version_stats(db: Session, dataset: models.Dataset):
+    """Метрики колонок из сохранённого профиля: (таблица, число строк) или None"""
+
+    cached = find_cached_profile(db, dataset, duplicates="approx")
+    stats = profile_stats(cached.metrics["profile"]) if cached else None
+    if stats is None:
+        return None
+    return stats, cached.metrics["profile"]["total_rows"]
+
+
+def raw_version_stats(dataset: models.Dataset) -> tuple:
+    """Метрики колонок по самим данным: (таблица, число строк)"""
+
+    df = load_dataframe(dataset)
+    return column_stats(df), len(df)
+
+
+def version_stats(db: Session, dataset: models.Dataset, source: str) -> tuple:
+    """Метрики колонок версии для сравнения: (таблица, число строк, откуда взяты)
+
+    source=auto — из профиля, если он есть, иначе по данным; profile без
+    профиля — ValueError.
+    """
+
+    if source != "raw":
+        found = profile_version_stats(db, dataset)
+        if found is not None:
+            return (*found, "profile")
+        if source == "profile":
+            raise ValueError(
+                f"Dataset {dataset.id} has no profile with column summary; profile it first or use source=raw"
+            )
+    return (*raw_version_stats(dataset), "raw")
+
+
+def _version_info(dataset: models.Dataset) -> dict:
+    return {"id": dataset.id, "name": dataset.name, "version": dataset.version}
+
+
+def version_timeline(db: Session, versions: list, n_jobs: int = TIMELINE_WORKERS) -> list:
+    """Дрейф каждой пары соседних версий
+
+    Пары кэшируются в VersionDrift по содержимому обеих версий, так что
+    повторный запрос (и другие цепочки с тем же содержимым) файлы не
+    читает. Для пар без кэша метрики каждой версии считаются один раз —
+    версия входит в две соседние пары: из профиля, если он есть, иначе
+    по данным, в несколько потоков. Пары, где у версии нет токена
+    содержимого (старая запись без файла), не кэшируются.
+    """
+
+    tokens = [cache_token(v) for v in versions]
+    pairs = list(zip(range(len(versions) - 1), range(1, len(versions))))
+    cacheable = [(i, j) for i, j in pairs if tokens[i] and tokens[j]]
+
+    def load_cached() -> dict:
+        found = {}
+        if not cacheable:
+            return found
+        query = db.query(models.VersionDrift).filter(models.VersionDrift.old_hash.in_({tokens[i] for i, _ in cacheable}))
+        for entry in query:
+            found[(entry.old_hash, entry.new_hash)] = entry
+        return {(i, j): found[(tokens[i], tokens[j])] for i, j in cacheable if (tokens[i], tokens[j]) in found}
+
+    results = load_cached()
+    pending = [pair for pair in pairs if pair not in results]
+
+    stats = {}
+    needed = sorted({k for pair in pending for k in pair})
+    for k in needed:
+        found = profile_version_stats(db, versions[k])
+        if found is not None:
+            stats[k] = (*found, "profile")
+
+    raw = [k for k in needed if k not in stats]
+    if raw:
+        with Parallel(n_jobs=min(n_jobs, len(raw)), prefer="threads") as parallel:
+            loaded = parallel(delayed(raw_version_stats)(versions[k]) for k in raw)
+        for k, found in zip(raw, loaded):
+            stats[k] = (*found, "raw")
+
+    computed = {}
+    for i, j in pending:
+        old_stats, old_rows, old_source = stats[i]
+        new_stats, new_rows, new_source = stats[j]
+        comparison = compare_stats(old_stats, new_stats, old_rows, new_rows)
+        computed[(i, j)] = models.VersionDrift(
+            old_hash=tokens[i],
+            new_hash=tokens[j],
+            sources=[old_source, new_source],
+            drift_score=calculate_drift_score(comparison),
+            comparison=comparison
+        )
+
+    to_store = {}
+    for (i, j), entry in computed.items():
+        if tokens[i] and tokens[j]:
+            to_store.setdefault((tokens[i], tokens[j]), entry)
+    if to_store:
+        db.add_all(to_store.values())
+        try:
+            db.commit()
+        except IntegrityError:
+            # Ту же пару параллельно сохранил другой запрос — берём его запись
+            db.rollback()
+            results.update(load_cached())
+    results.update({pair: entry for pair, entry in computed.items() if pair not in results})
+
+    timeline = []
+    for i, j in pairs:
+        entry = results[(i, j)]
+        timeline.append({
+            "from": _version_info(versions[i]),
+            "to": _version_info(versions[j]),
+            "cached": (i, j) not in computed,
+            "sources": entry.sources,
+            "drift_score": entry.drift_score,
+            "comparison": entry.comparison
+        })
+    return timeline
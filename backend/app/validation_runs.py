@@ -0,0 +1,264 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Iterator, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session, joinedload
+
+from . import models
+from .storage import UPLOAD_DIR, cache_token, load_dataframe, iter_chunks, read_rows
+from .jobs import resolve_engine, PROFILE_CHUNK_ROWS
+from .validator import (
+    evaluate_rules, evaluate_rules_chunked, count_invalid_rows, summarize, violation_details
+)
+
+# Позиции нарушающих строк: validation/<dataset_id>/<content>-<rule>.npy
+VALIDATION_DIR = UPLOAD_DIR / "validation"
+
+
+def rule_hash(rule: models.ValidationRule) -> str:
+    """Хеш правила: id, колонка, тип и параметры — изменение любого требует перепроверки"""
+    payload = json.dumps(
+        [rule.id, rule.column_name, rule.rule_type, rule.parameters or {}],
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def rules_hash(rule_hashes: list, sample_size: int, sampling: str) -> str:
+    """Хеш набора правил (в порядке ответа) вместе с параметрами выборки нарушений"""
+    payload = json.dumps([rule_hashes, sample_size, sampling])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def latest_run(db: Session, dataset_id: int) -> Optional[models.ValidationRun]:
+    """Последний прогон датасета вместе с результатами — один запрос по индексу dataset_id"""
+
+    return db.query(models.ValidationRun) \
+        .options(joinedload(models.ValidationRun.results)) \
+        .filter(models.ValidationRun.dataset_id == dataset_id) \
+        .order_by(models.ValidationRun.id.desc()) \
+        .first()
+
+
+def _violations_path(dataset: models.Dataset, content_hash: str, rule_key: str):
+    return VALIDATION_DIR / str(dataset.id) / f"{content_hash[:16]}-{rule_key[:16]}.npy"
+
+
+def _load_violations(result: models.ValidationResult) -> np.ndarray:
+    if not result.violations:
+        return np.empty(0, dtype=np.int64)
+    return np.load(result.violations_path)
+
+
+def _reusable(result: Optional[models.ValidationResult]) -> bool:
+    """Результат прошлого прогона годится, если файл с позициями нарушений на месте"""
+    if result is None:
+        return False
+    if not result.violations:
+        return True
+    return bool(result.violations_path) and os.path.exists(result.violations_path)
+
+
+def run_validation(
+    db: Session,
+    dataset: models.Dataset,
+    rules: list,
+    sample_size: int,
+    sampling: str,
+    engine: str = "auto"
+) -> models.ValidationRun:
+    """Валидация с сохранением прогона
+
+    Если датасет и правила не менялись с последнего прогона, он возвращается
+    как есть, без чтения файла. Иначе перепроверяются только новые и
+    изменённые правила, результаты остальных берутся из прошлого прогона
+    (при том же содержимом и тех же параметрах выборки). engine=chunked
+    (или auto для больших файлов) читает файл потоково.
+    """
+
+    content_hash = cache_token(dataset)
+    hashes = [rule_hash(rule) for rule in rules]
+    key = rules_hash(hashes, sample_size, sampling)
+
+    previous = latest_run(db, dataset.id)
+    if previous and previous.content_hash == content_hash and previous.rules_hash == key:
+        return previous
+
+    cached = {}
+    if previous and previous.content_hash == content_hash \
+            and previous.sample_size == sample_size and previous.sampling == sampling:
+        cached = {(r.rule_id, r.rule_hash): r for r in previous.results}
+
+    reused = {}
+    pending = []
+    for position, (rule, h) in enumerate(zip(rules, hashes)):
+        result = cached.get((rule.id, h))
+        if _reusable(result):
+            reused[position] = result
+        else:
+            pending.append(position)
+
+    results = [None] * len(rules)
+    violated = [None] * len(rules)
+
+    for position, result in reused.items():
+        results[position] = result_to_dict(result)
+        violated[position] = _load_violations(result)
+
+    paths = {}
+    if pending:
+        dataset_dir = VALIDATION_DIR / str(dataset.id)
+        dataset_dir.mkdir(parents=True, exist_ok=True)
+        pending_rules = [rules[p] for p in pending]
+
+        with tempfile.TemporaryDirectory(dir=dataset_dir) as spill_dir:
+            if resolve_engine(dataset, engine) == "chunked":
+                fresh, fresh_violated = evaluate_rules_chunked(
+                    lambda text_columns: iter_chunks(dataset, PROFILE_CHUNK_ROWS, text_columns),
+                    pending_rules, spill_dir, sample_size, sampling
+                )
+            else:
+                fresh, fresh_violated = evaluate_rules(load_dataframe(dataset), pending_rules, sample_size, sampling)
+
+            for position, result, rows in zip(pending, fresh, fresh_violated):
+                results[position] = result
+                violated[position] = rows
+                if len(rows):
+                    path = _violations_path(dataset, content_hash, hashes[position])
+                    if isinstance(rows, np.memmap):
+                        os.replace(rows.filename, path)
+                    else:
+                        np.save(path, rows)
+                    paths[position] = str(path)
+
+    summary = summarize(results, count_invalid_rows(violated))
+
+    run = models.ValidationRun(
+        dataset_id=dataset.id,
+        content_hash=content_hash,
+        rules_hash=key,
+        sample_size=sample_size,
+        sampling=sampling,
+        overall_status=summary["overall_status"],
+        total_rules=summary["total_rules"],
+        passed=summary["passed"],
+        failed=summary["failed"],
+        invalid_rows=summary["invalid_rows"],
+        reused_rules=len(reused)
+    )
+    for position, result in enumerate(results):
+        run.results.append(models.ValidationResult(
+            position=position,
+            rule_id=result["rule_id"],
+            rule_hash=hashes[position],
+            column_name=result["column"],
+            rule_type=result["rule_type"],
+            parameters=result["parameters"],
+            status=result["status"],
+            message=result["message"],
+            violations=result["violations"],
+            violation_details=result["violation_details"],
+            violations_path=reused[position].violations_path if position in reused else paths.get(position)
+        ))
+
+    db.add(run)
+    db.commit()
+    db.refresh(run)
+    return run
+
+
+def delete_runs(db: Session, dataset: models.Dataset) -> None:
+    """Удаляем прогоны датасета и файлы с позициями нарушений"""
+
+    for run in dataset.validation_runs:
+        db.delete(run)
+    db.commit()
+    shutil.rmtree(VALIDATION_DIR / str(dataset.id), ignore_errors=True)
+
+
+def find_run(db: Session, dataset_id: int, run_id: int) -> Optional[models.ValidationRun]:
+    return db.query(models.ValidationRun) \
+        .filter(models.ValidationRun.id == run_id) \
+        .filter(models.ValidationRun.dataset_id == dataset_id) \
+        .first()
+
+
+def find_result(db: Session, run: models.ValidationRun, rule_id: int) -> Optional[models.ValidationResult]:
+    return db.query(models.ValidationResult) \
+        .filter(models.ValidationResult.run_id == run.id) \
+        .filter(models.ValidationResult.rule_id == rule_id) \
+        .first()
+
+
+def violations_page(dataset: models.Dataset, result: models.ValidationResult, cursor: int, limit: int) -> dict:
+    """Страница нарушений правила в порядке строк
+
+    Позиции берутся срезом из .npy (memmap), строки — read_rows, так что
+    ни весь список нарушений, ни весь файл в память не попадают. cursor —
+    номер нарушения, с которого начинается страница.
+    """
+
+    total = result.violations or 0
+    rows = np.load(result.violations_path, mmap_mode="r")[cursor:cursor + limit] if total else []
+    details = []
+    if len(rows):
+        df = read_rows(dataset, rows)
+        details = violation_details(df, np.arange(len(df)), result.column_name)
+
+    next_cursor = cursor + len(rows)
+    return {
+        "rule_id": result.rule_id,
+        "total": total,
+        "cursor": cursor,
+        "next_cursor": next_cursor if next_cursor < total else None,
+        "violations": details
+    }
+
+
+def result_to_dict(result: models.ValidationResult, details: bool = True) -> dict:
+    """Результат правила в формате ответа /validate; details=False — только счётчики"""
+
+    data = {
+        "rule_id": result.rule_id,
+        "column": result.column_name,
+        "rule_type": result.rule_type,
+        "parameters": result.parameters,
+        "status": result.status,
+        "message": result.message,
+        "violations": result.violations
+    }
+    if details:
+        data["violation_details"] = result.violation_details or []
+    return data
+
+
+def run_to_dict(run: models.ValidationRun, details: bool = False) -> dict:
+    """Представление прогона для API: по умолчанию без примеров нарушений —
+    они отдаются постранично или в NDJSON"""
+
+    return {
+        "run_id": run.id,
+        "dataset_id": run.dataset_id,
+        "created_at": run.created_at,
+        "overall_status": run.overall_status,
+        "total_rules": run.total_rules,
+        "passed": run.passed,
+        "failed": run.failed,
+        "invalid_rows": run.invalid_rows,
+        "reused_rules": run.reused_rules,
+        "results": [result_to_dict(r, details) for r in run.results]
+    }
+
+
+def run_lines(run: models.ValidationRun) -> Iterator[dict]:
+    """Прогон для NDJSON: сначала итог без результатов, затем по строке на правило с примерами"""
+
+    summary = run_to_dict(run)
+    summary.pop("results")
+    yield summary
+    for result in run.results:
+        yield result_to_dict(result)
@@ -0,0 +1,683 @@
+import os
+import shutil
+import operator
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from numbers import Real
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+from .fingerprint import column_hash, DuplicatePositions
+from .regex_rules import pattern_problem, match_values, match_arrow, to_arrow_strings, arrow_traits
+
+RULE_TYPES = ("not_null", "unique", "range", "regex", "in_set", "min_length", "max_length", "compare")
+
+# Операторы правила compare: column <op> other
+COMPARE_OPS = {
+    "<": operator.lt, "<=": operator.le, ">": operator.gt,
+    ">=": operator.ge, "==": operator.eq, "!=": operator.ne,
+}
+
+# Типы колонок, к которым применяется правило range
+NUMERIC_DTYPES = ('int64', 'float64', 'int32', 'float32')
+
+# Сколько нарушений с данными строки возвращается по каждому правилу
+VIOLATION_SAMPLE_SIZE = 50
+MAX_VIOLATION_SAMPLE_SIZE = 1000
+
+# first — первые по порядку строки, random — случайные (воспроизводимо для правила)
+SAMPLING_MODES = ("first", "random")
+
+# Потоков для проверки колонок и процессов для regex (по умолчанию — все ядра)
+VALIDATION_WORKERS = int(os.getenv("VALIDATION_WORKERS", os.cpu_count() or 1))
+
+# С какого числа уникальных значений regex делится между процессами
+REGEX_PROCESS_MIN_VALUES = 50_000
+
+_regex_executor = None
+
+
+def get_regex_executor() -> ProcessPoolExecutor:
+    """Пул процессов для regex создаётся лениво (spawn, как у фоновых задач)"""
+    global _regex_executor
+    if _regex_executor is None:
+        _regex_executor = ProcessPoolExecutor(
+            max_workers=VALIDATION_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _regex_executor
+
+
+class ColumnView:
+    """Преобразования одной колонки, общие для всех её правил
+
+    Каждое считается лениво и один раз: сколько бы правил ни ссылалось на
+    колонку, isna, хеши для unique и astype(str) для regex выполняются
+    по одному разу.
+    """
+
+    def __init__(self, series: pd.Series):
+        self.series = series
+        self._cache = {}
+
+    def _cached(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    @property
+    def isnull(self) -> np.ndarray:
+        return self._cached("isnull", lambda: self.series.isna().to_numpy())
+
+    @property
+    def hashes(self) -> np.ndarray:
+        return self._cached("hashes", lambda: column_hash(self.series))
+
+    @property
+    def duplicated(self) -> np.ndarray:
+        """Все вхождения повторяющихся значений (как duplicated(keep=False))"""
+        return self._cached(
+            "duplicated",
+            lambda: pd.Series(self.hashes).duplicated(keep=False).to_numpy()
+        )
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._cached("values", lambda: self.series.to_numpy())
+
+    @property
+    def arrow(self):
+        """Колонка как строки Arrow для regex или None, если так нельзя"""
+        return self._cached("arrow", lambda: to_arrow_strings(self.series))
+
+    @property
+    def arrow_traits(self) -> dict:
+        return self._cached("arrow_traits", lambda: arrow_traits(self.arrow))
+
+    @property
+    def text(self) -> tuple:
+        """Строковые значения как (codes, uniques): regex проверяется по уникальным"""
+        return self._cached("text", lambda: pd.factorize(self.series.astype(str)))
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """Длина текста каждого значения — считается по уникальным"""
+        def compute():
+            codes, uniques = self.text
+            return uniques.str.len().to_numpy()[codes]
+        return self._cached("lengths", compute)
+
+
+def _range_mask(view: ColumnView, params: dict) -> np.ndarray:
+    values = view.values
+    mask = np.zeros(len(values), dtype=bool)
+    min_val = params.get("min")
+    max_val = params.get("max")
+    with np.errstate(invalid="ignore"):
+        if min_val is not None:
+            mask |= values < min_val
+        if max_val is not None:
+            mask |= values > max_val
+    return mask
+
+
+def _regex_mask(view: ColumnView, pattern: str, n_jobs: int = 1) -> np.ndarray:
+    """Маска строк, не подходящих под шаблон (re.match по astype(str))
+
+    Если колонку можно представить строками Arrow и шаблон совпадает по
+    смыслу с RE2, проверка идёт в pyarrow без GIL; пропуски (их текст —
+    'None', 'nan') досчитываются отдельно. Иначе re.match идёт по уникальным
+    значениям, а большой их набор делится между процессами.
+    """
+
+    if view.arrow is not None:
+        matched = match_arrow(pattern, view.arrow, view.arrow_traits)
+        if matched is not None:
+            null_rows = np.flatnonzero(view.isnull)
+            if len(null_rows):
+                codes, uniques = pd.factorize(view.series.iloc[null_rows].astype(str))
+                matched[null_rows] = match_values(pattern, uniques)[codes]
+            return ~matched
+
+    codes, uniques = view.text
+    if n_jobs > 1 and len(uniques) >= REGEX_PROCESS_MIN_VALUES:
+        parts = np.array_split(np.asarray(uniques, dtype=object), n_jobs)
+        matched = np.concatenate(list(get_regex_executor().map(match_values, repeat(pattern), parts)))
+    else:
+        matched = match_values(pattern, uniques)
+    return ~matched[codes]
+
+
+def _in_set_mask(view: ColumnView, values: list) -> np.ndarray:
+    """Значения не из набора (хеш-поиск isin); пропуски не считаются нарушением (для них есть not_null)
+
+    В текстовой колонке числа из набора ищутся и как текст: CSV-колонка с
+    одним нечисловым значением читается целиком как строки.
+    """
+    if view.series.dtype == object:
+        values = values + [str(value) for value in values if _is_number(value)]
+    return ~view.series.isin(values).to_numpy() & ~view.isnull
+
+
+def _length_mask(view: ColumnView, rule_type: str, length: int) -> np.ndarray:
+    lengths = view.lengths
+    too_short_or_long = lengths < length if rule_type == "min_length" else lengths > length
+    return too_short_or_long & ~view.isnull
+
+
+def _compare_mask(view: ColumnView, other: pd.Series, op: str) -> Optional[np.ndarray]:
+    """Строки, где column <op> other не выполняется; None — если типы колонок несравнимы
+
+    Числа сравниваются как числа, остальное — как текст (даты в ISO-формате
+    так сравниваются правильно). Строки с пропуском в любой из колонок не
+    проверяются.
+    """
+
+    left_numeric = str(view.series.dtype) in NUMERIC_DTYPES
+    right_numeric = str(other.dtype) in NUMERIC_DTYPES
+    if left_numeric != right_numeric:
+        return None
+
+    if left_numeric:
+        left, right = view.values, other.to_numpy()
+    else:
+        left, right = view.series.astype(str).to_numpy(), other.astype(str).to_numpy()
+
+    with np.errstate(invalid="ignore"):
+        holds = COMPARE_OPS[op](left, right).astype(bool)
+    return ~holds & ~view.isnull & ~other.isna().to_numpy()
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, Real) and not isinstance(value, bool)
+
+
+def rule_problem(rule_type: str, params: Optional[dict]) -> Optional[str]:
+    """Почему правило с такими параметрами нельзя проверить, или None
+
+    Вызывается при создании правила (ошибка → 400) и перед проверкой
+    (ошибка → результат ERROR).
+    """
+
+    params = params or {}
+
+    if rule_type not in RULE_TYPES:
+        return f"Unknown rule type '{rule_type}'. Supported: {', '.join(RULE_TYPES)}"
+
+    if rule_type == "range":
+        bounds = {name: params.get(name) for name in ("min", "max") if params.get(name) is not None}
+        if not bounds:
+            return "Range rule needs 'min' and/or 'max'"
+        if not all(_is_number(value) for value in bounds.values()):
+            return "Range bounds must be numbers"
+        if len(bounds) == 2 and bounds["min"] > bounds["max"]:
+            return "Range 'min' must not be greater than 'max'"
+
+    if rule_type == "regex":
+        return pattern_problem(params.get("pattern"))
+
+    if rule_type == "in_set":
+        values = params.get("values")
+        if not isinstance(values, list) or not values:
+            return "in_set rule needs a non-empty 'values' list"
+        if any(isinstance(value, (list, dict)) for value in values):
+            return "in_set values must be strings, numbers or booleans"
+
+    if rule_type in ("min_length", "max_length"):
+        length = params.get("length")
+        if not isinstance(length, int) or isinstance(length, bool) or length < 0:
+            return f"{rule_type} rule needs a non-negative integer 'length'"
+
+    if rule_type == "compare":
+        if not isinstance(params.get("other"), str) or not params.get("other"):
+            return "compare rule needs 'other' — the column to compare with"
+        if params.get("op") not in COMPARE_OPS:
+            return f"compare 'op' must be one of {', '.join(COMPARE_OPS)}"
+
+    return None
+
+
+def _result(rule, status: str, message: str, violations: int = 0, details: list = None) -> dict:
+    return {
+        "rule_id": rule.id,
+        "column": rule.column_name,
+        "rule_type": rule.rule_type,
+        "parameters": rule.parameters,
+        "status": status,
+        "message": message,
+        "violations": violations,
+        "violation_details": details or []
+    }
+
+
+def _sample_positions(positions: np.ndarray, sample_size: int, sampling: str, seed: int) -> np.ndarray:
+    """Позиции строк для примеров нарушений — без фильтрации всего DataFrame"""
+
+    if len(positions) <= sample_size:
+        return positions
+    if sampling == "random":
+        rng = np.random.default_rng(seed)
+        return np.sort(rng.choice(positions, sample_size, replace=False))
+    return positions[:sample_size]
+
+
+def violation_details(df: pd.DataFrame, positions: np.ndarray, col: str) -> list:
+    """Нарушения с данными строки; строки собираются по колонкам из маленького среза"""
+
+    if len(positions) == 0:
+        return []
+
+    sample = df.iloc[positions]
+    row_data = {
+        name: [str(v)[:50] for v in cells]
+        for name, cells in sample.to_dict("list").items()
+    }
+    values = [str(v)[:100] for v in sample[col].tolist()]
+
+    return [
+        {
+            "row_index": int(idx),
+            "column_value": values[i],
+            "row_data": {name: cells[i] for name, cells in row_data.items()}
+        }
+        for i, idx in enumerate(sample.index)
+    ]
+
+
+def _check_rule(view: ColumnView, rule, n_jobs: int, df: pd.DataFrame) -> tuple:
+    """Одно правило по колонке: (готовый результат SKIPPED/ERROR или None, маска нарушений или None)
+
+    df — весь DataFrame (или чанк): нужен правилам, которые смотрят на вторую колонку.
+    """
+
+    params = rule.parameters or {}
+
+    problem = rule_problem(rule.rule_type, params)
+    if problem:
+        return _result(rule, "ERROR", problem), None
+
+    if rule.rule_type == "not_null":
+        return None, view.isnull
+
+    if rule.rule_type == "unique":
+        return None, view.duplicated
+
+    if rule.rule_type == "range":
+        if view.series.dtype not in NUMERIC_DTYPES:
+            return _result(
+                rule, "SKIPPED",
+                f"Column '{rule.column_name}' is not numeric (type: {view.series.dtype}). Range rule skipped."
+            ), None
+        return None, _range_mask(view, params)
+
+    if rule.rule_type == "regex":
+        return None, _regex_mask(view, params["pattern"], n_jobs)
+
+    if rule.rule_type == "in_set":
+        return None, _in_set_mask(view, params["values"])
+
+    if rule.rule_type in ("min_length", "max_length"):
+        return None, _length_mask(view, rule.rule_type, params["length"])
+
+    if rule.rule_type == "compare":
+        other = params["other"]
+        if other not in df.columns:
+            return _result(rule, "ERROR", f"Column '{other}' not found in dataset"), None
+        mask = _compare_mask(view, df[other], params["op"])
+        if mask is None:
+            return _result(
+                rule, "SKIPPED",
+                f"Columns '{rule.column_name}' ({view.series.dtype}) and '{other}' ({df[other].dtype}) "
+                f"are not comparable. Compare rule skipped."
+            ), None
+        return None, mask
+
+    return None, None
+
+
+def _missing_column(rule) -> dict:
+    return _result(rule, "ERROR", f"Column '{rule.column_name}' not found in dataset")
+
+
+def _evaluate_column(
+    df: pd.DataFrame,
+    col: str,
+    column_rules: list,
+    sample_size: int,
+    sampling: str,
+    n_jobs: int
+) -> list:
+    """Правила одной колонки; возвращаем [(позиция правила, результат, позиции нарушений)]"""
+
+    empty = np.empty(0, dtype=np.int64)
+
+    if col not in df.columns:
+        return [(position, _missing_column(rule), empty) for position, rule in column_rules]
+
+    view = ColumnView(df[col])
+    evaluated = []
+
+    for position, rule in column_rules:
+        fixed, mask = _check_rule(view, rule, n_jobs, df)
+        if fixed is not None:
+            evaluated.append((position, fixed, empty))
+            continue
+
+        rows = np.flatnonzero(mask) if mask is not None else empty
+        if len(rows) == 0:
+            evaluated.append((position, _result(rule, "PASSED", "All values valid"), empty))
+            continue
+
+        evaluated.append((position, _result(
+            rule, "FAILED", f"Found {len(rows)} violations",
+            len(rows), violation_details(df, _sample_positions(rows, sample_size, sampling, rule.id), col)
+        ), rows))
+
+    return evaluated
+
+
+def evaluate_rules(
+    df: pd.DataFrame,
+    rules: list,
+    sample_size: int = VIOLATION_SAMPLE_SIZE,
+    sampling: str = "first",
+    n_jobs: int = VALIDATION_WORKERS
+) -> tuple:
+    """Проверяем все правила; возвращаем (результаты, позиции нарушающих строк) в порядке правил
+
+    Правила группируются по колонке, и каждая колонка преобразуется один
+    раз (ColumnView). Колонки проверяются параллельно в n_jobs потоках:
+    сравнения numpy, isna и хеширование отпускают GIL. Regex по большому
+    набору уникальных значений уходит в пул процессов. Результаты
+    раскладываются по позициям правил, так что порядок не зависит от
+    того, какой поток закончил первым. От маски правила остаются только
+    позиции нарушений; в violation_details — не больше sample_size строк.
+    """
+
+    by_column = defaultdict(list)
+    for position, rule in enumerate(rules):
+        by_column[rule.column_name].append((position, rule))
+
+    groups = Parallel(n_jobs=min(n_jobs, max(len(by_column), 1)), prefer="threads")(
+        delayed(_evaluate_column)(df, col, column_rules, sample_size, sampling, n_jobs)
+        for col, column_rules in by_column.items()
+    )
+
+    results = [None] * len(rules)
+    violated = [None] * len(rules)
+    for evaluated in groups:
+        for position, result, rows in evaluated:
+            results[position] = result
+            violated[position] = rows
+
+    return results, violated
+
+
+def count_invalid_rows(violated: list) -> int:
+    """Число строк, нарушающих хотя бы одно правило"""
+
+    violated = [rows for rows in violated if len(rows)]
+    if not violated:
+        return 0
+    mask = np.zeros(max(int(rows[-1]) for rows in violated) + 1, dtype=bool)
+    for rows in violated:
+        mask[rows] = True
+    return int(mask.sum())
+
+
+def summarize(results: list, invalid_rows: int) -> dict:
+    """Итог валидации по результатам правил"""
+
+    failed = any(r["status"] in ("FAILED", "ERROR") for r in results)
+    return {
+        "overall_status": "FAILED" if failed else "PASSED",
+        "total_rules": len(results),
+        "passed": sum(1 for r in results if r["status"] == "PASSED"),
+        "failed": sum(1 for r in results if r["status"] == "FAILED"),
+        "invalid_rows": invalid_rows,
+        "results": results
+    }
+
+
+def validate_dataframe(
+    df: pd.DataFrame,
+    rules: list,
+    sample_size: int = VIOLATION_SAMPLE_SIZE,
+    sampling: str = "first"
+) -> dict:
+    """Итог валидации датасета по правилам"""
+
+    results, violated = evaluate_rules(df, rules, sample_size, sampling)
+    return summarize(results, count_invalid_rows(violated))
+
+
+def _merge_dtype(seen: str, dtype: str) -> str:
+    """Тип колонки во всём файле по типам в чанках: числа расширяются до float64, иначе — текст"""
+    if seen == dtype:
+        return dtype
+    numeric = {seen, dtype} <= {"int64", "int32", "float64", "float32"}
+    return "float64" if numeric else "object"
+
+
+def _write_npy(raw_path: str, npy_path: str, count: int) -> None:
+    """Сырые int64 из raw_path → .npy, не загружая их в память"""
+    header = {"descr": np.lib.format.dtype_to_descr(np.dtype(np.int64)), "fortran_order": False, "shape": (count,)}
+    with open(npy_path, "wb") as out, open(raw_path, "rb") as raw:
+        np.lib.format.write_array_header_1_0(out, header)
+        shutil.copyfileobj(raw, out)
+    os.remove(raw_path)
+
+
+class _RuleStream:
+    """Нарушения одного правила по чанкам: счётчик, позиции на диске и выборка примеров
+
+    first — берём первые sample_size нарушений; random — bottom-k по случайным
+    ключам (seed — id правила), то есть равномерная выборка по всему файлу.
+    """
+
+    def __init__(self, rule, position: int, sample_size: int, sampling: str, spill_dir: str):
+        self.rule = rule
+        self.sample_size = sample_size
+        self.sampling = sampling
+        self.fixed = None
+        self.count = 0
+        self.details = []
+        self.keys = []
+        self._rng = np.random.default_rng(rule.id)
+        self._raw_path = os.path.join(spill_dir, f"{position}.raw")
+        self._npy_path = os.path.join(spill_dir, f"{position}.npy")
+        open(self._raw_path, "wb").close()
+
+    def add(self, chunk: pd.DataFrame, rows: np.ndarray, offset: int) -> None:
+        if len(rows) == 0:
+            return
+        self.count += len(rows)
+        with open(self._raw_path, "ab") as out:
+            (rows + offset).astype(np.int64).tofile(out)
+
+        col = self.rule.column_name
+        if self.sampling == "first":
+            need = self.sample_size - len(self.details)
+            if need > 0:
+                self.details += violation_details(chunk, rows[:need], col)
+            return
+
+        keys = self._rng.random(len(rows))
+        threshold = max(self.keys) if len(self.keys) >= self.sample_size else np.inf
+        picked = np.flatnonzero(keys < threshold)
+        if len(picked) > self.sample_size:
+            picked = np.sort(picked[np.argpartition(keys[picked], self.sample_size)[:self.sample_size]])
+        if len(picked) == 0:
+            return
+        keys = self.keys + keys[picked].tolist()
+        details = self.details + violation_details(chunk, rows[picked], col)
+        keep = np.argsort(keys, kind="stable")[:self.sample_size]
+        self.keys = [keys[i] for i in keep]
+        self.details = [details[i] for i in keep]
+
+    def finish(self) -> tuple:
+        """(результат, позиции нарушений — memmap .npy в spill_dir)"""
+
+        if self.fixed is not None or self.count == 0:
+            os.remove(self._raw_path)
+            return self.fixed or _result(self.rule, "PASSED", "All values valid"), np.empty(0, dtype=np.int64)
+
+        _write_npy(self._raw_path, self._npy_path, self.count)
+        details = sorted(self.details, key=lambda d: d["row_index"])
+        return _result(
+            self.rule, "FAILED", f"Found {self.count} violations", self.count, details
+        ), np.load(self._npy_path, mmap_mode="r")
+
+    def finish_with(self, rows: np.ndarray) -> tuple:
+        """Для unique: позиции известны только после всего прохода, примеры добираются отдельно"""
+
+        os.remove(self._raw_path)
+        if len(rows) == 0:
+            return _result(self.rule, "PASSED", "All values valid"), np.empty(0, dtype=np.int64)
+        np.save(self._npy_path, rows)
+        return _result(
+            self.rule, "FAILED", f"Found {len(rows)} violations", len(rows)
+        ), np.load(self._npy_path, mmap_mode="r")
+
+
+def _chunk_column(chunk: pd.DataFrame, col: str, column_rules: list, unique: bool, n_jobs: int) -> tuple:
+    """Правила колонки по одному чанку: ([(позиция, результат или None, позиции нарушений)], хеши для unique)"""
+
+    view = ColumnView(chunk[col])
+    checked = []
+    for position, rule in column_rules:
+        if rule.rule_type == "unique":
+            continue
+        fixed, mask = _check_rule(view, rule, n_jobs, chunk)
+        checked.append((position, fixed, np.flatnonzero(mask) if mask is not None else None))
+    return checked, view.hashes if unique else None
+
+
+def _stream_pass(chunks, rules: list, sample_size: int, sampling: str, spill_dir: str,
+                 float_columns: list, n_jobs: int) -> dict:
+    """Один проход по чанкам; если тип колонки в чанках расходится, возвращает её в retype"""
+
+    by_column = defaultdict(list)
+    for position, rule in enumerate(rules):
+        by_column[rule.column_name].append((position, rule))
+
+    state = {
+        "total": 0, "columns": None, "dtypes": {}, "retype": {},
+        "streams": [_RuleStream(rule, position, sample_size, sampling, spill_dir) for position, rule in enumerate(rules)],
+        "duplicates": {}
+    }
+    streams, duplicates, dtypes = state["streams"], state["duplicates"], state["dtypes"]
+
+    with Parallel(n_jobs=min(n_jobs, max(len(by_column), 1)), prefer="threads") as parallel:
+        for chunk in chunks:
+            offset = state["total"]
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            for col in float_columns:
+                if col in chunk.columns:
+                    chunk[col] = chunk[col].astype(np.float64)
+
+            if state["columns"] is None:
+                state["columns"] = list(chunk.columns)
+                for col, column_rules in by_column.items():
+                    if any(rule.rule_type == "unique" for _, rule in column_rules) and col in chunk.columns:
+                        duplicates[col] = DuplicatePositions()
+
+            for col in chunk.columns:
+                dtype = str(chunk[col].dtype)
+                seen = dtypes.setdefault(col, dtype)
+                if dtype != seen:
+                    state["retype"][col] = _merge_dtype(seen, dtype)
+            if state["retype"]:
+                for counter in duplicates.values():
+                    counter.discard()
+                return state
+
+            present = [(col, column_rules) for col, column_rules in by_column.items() if col in chunk.columns]
+            groups = parallel(
+                delayed(_chunk_column)(chunk, col, column_rules, col in duplicates, n_jobs)
+                for col, column_rules in present
+            )
+            for (col, _), (checked, hashes) in zip(present, groups):
+                for position, fixed, rows in checked:
+                    stream = streams[position]
+                    if fixed is not None:
+                        stream.fixed = stream.fixed or fixed
+                    elif rows is not None and stream.fixed is None:
+                        stream.add(chunk, rows, offset)
+                if hashes is not None:
+                    duplicates[col].add(hashes, np.arange(offset, offset + len(chunk)))
+
+            state["total"] += len(chunk)
+
+    return state
+
+
+def evaluate_rules_chunked(
+    read_chunks,
+    rules: list,
+    spill_dir: str,
+    sample_size: int = VIOLATION_SAMPLE_SIZE,
+    sampling: str = "first",
+    n_jobs: int = VALIDATION_WORKERS
+) -> tuple:
+    """То же, что evaluate_rules, но потоково: файл читается чанками и целиком в память не попадает
+
+    read_chunks(text_columns) при каждом вызове возвращает новый итератор по
+    чанкам; колонки из text_columns нужно читать как текст. Если тип колонки
+    в чанках CSV расходится, проход повторяется с типом, который получился бы
+    при чтении всего файла (float64 или текст) — как в profile_chunked.
+
+    Счётчики и позиции нарушений (в spill_dir, .npy) копятся по чанкам.
+    unique — единственное правило, которому нужны все чанки сразу: пары
+    (хеш, позиция) уходят в DuplicatePositions с выгрузкой на диск, а
+    примеры для него собираются вторым проходом. Позиции нарушений
+    возвращаются как memmap, результаты — как у evaluate_rules.
+    """
+
+    text_columns, float_columns = [], []
+    while True:
+        state = _stream_pass(read_chunks(text_columns), rules, sample_size, sampling, spill_dir, float_columns, n_jobs)
+        if not state["retype"]:
+            break
+        for col, dtype in state["retype"].items():
+            (text_columns if dtype == "object" else float_columns).append(col)
+
+    results = [None] * len(rules)
+    violated = [None] * len(rules)
+    pending_details = {}
+    duplicates = {col: counter.positions() for col, counter in state["duplicates"].items()}
+
+    for position, (rule, stream) in enumerate(zip(rules, state["streams"])):
+        if state["columns"] is not None and rule.column_name not in state["columns"]:
+            stream.fixed = _missing_column(rule)
+        if rule.rule_type == "unique" and stream.fixed is None:
+            rows = duplicates[rule.column_name]
+            results[position], violated[position] = stream.finish_with(rows)
+            if len(rows):
+                pending_details[position] = _sample_positions(rows, sample_size, sampling, rule.id)
+        else:
+            results[position], violated[position] = stream.finish()
+
+    # Второй проход — только за примерами для unique; заканчивается на последнем нужном чанке
+    if pending_details:
+        last = max(int(rows[-1]) for rows in pending_details.values())
+        offset = 0
+        for chunk in read_chunks(text_columns):
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            for col in float_columns:
+                if col in chunk.columns:
+                    chunk[col] = chunk[col].astype(np.float64)
+            for position, rows in pending_details.items():
+                inside = rows[(rows >= offset) & (rows < offset + len(chunk))] - offset
+                if len(inside):
+                    results[position]["violation_details"] += violation_details(chunk, inside, rules[position].column_name)
+            offset += len(chunk)
+            if offset > last:
+                break
+
+    return results, violated
@@ -0,0 +1,133 @@
+"""Бенчмарк profile_dataset против прежней реализации с циклами по колонкам
+
+Генерирует кадр rows x columns (по умолчанию 1 000 000 x 100), проверяет,
+что общие поля профиля совпадают, и печатает время обеих реализаций:
+
+    cd backend && python benchmarks/profile_benchmark.py
+    python benchmarks/profile_benchmark.py --rows 300000 --text-share 0.1
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.profiler import profile_dataset, convert_to_native_types  # noqa: E402
+
+
+def baseline_profile(df: pd.DataFrame) -> dict:
+    """Прежний profile_dataset: по колонке за раз, агрегаты и duplicated() дважды"""
+
+    profile = {
+        "total_rows": len(df),
+        "total_columns": len(df.columns),
+        "columns": list(df.columns),
+        "missing_values": {},
+        "missing_percentage": {},
+        "duplicates": int(df.duplicated().sum()),
+        "duplicates_percentage": round(df.duplicated().sum() / len(df) * 100, 2),
+        "dtypes": {},
+        "numeric_stats": {},
+        "categorical_stats": {},
+        "outliers": {}
+    }
+
+    for col in df.columns:
+        profile["dtypes"][col] = str(df[col].dtype)
+
+    for col in df.columns:
+        missing = int(df[col].isnull().sum())
+        profile["missing_values"][col] = missing
+        profile["missing_percentage"][col] = round(missing / len(df) * 100, 2)
+
+    numeric_cols = df.select_dtypes(include='number').columns
+    for col in numeric_cols:
+        profile["numeric_stats"][col] = {
+            "min": round(float(df[col].min()), 2) if not pd.isna(df[col].min()) else None,
+            "max": round(float(df[col].max()), 2) if not pd.isna(df[col].max()) else None,
+            "mean": round(float(df[col].mean()), 2) if not pd.isna(df[col].mean()) else None,
+            "median": round(float(df[col].median()), 2) if not pd.isna(df[col].median()) else None,
+            "std": round(float(df[col].std()), 2) if not pd.isna(df[col].std()) else None,
+        }
+
+        clean = df[col].dropna()
+        if len(clean) > 3:
+            z_scores = np.abs(stats.zscore(clean))
+            outlier_count = int((z_scores > 3).sum())
+            profile["outliers"][col] = {
+                "count": outlier_count,
+                "percentage": round(outlier_count / len(df) * 100, 2)
+            }
+
+    cat_cols = df.select_dtypes(include=['object']).columns
+    for col in cat_cols:
+        profile["categorical_stats"][col] = {
+            "unique_count": int(df[col].nunique()),
+            "top_values": df[col].value_counts().head(5).to_dict()
+        }
+
+    return convert_to_native_types(profile)
+
+
+def make_frame(rows: int, columns: int, text_share: float, seed: int) -> pd.DataFrame:
+    """Кадр для бенчмарка: float с 5% NaN, целые и (доля text_share) короткие строки"""
+
+    rng = np.random.default_rng(seed)
+    text_columns = int(round(columns * text_share))
+    data = {}
+    for i in range(columns):
+        if i < text_columns:
+            data[f"s{i}"] = rng.choice(np.array(["alpha", "beta", "gamma", "delta", None], dtype=object), rows)
+        elif i % 2:
+            data[f"i{i}"] = rng.integers(0, 1000, rows)
+        else:
+            values = rng.normal(size=rows)
+            values[rng.random(rows) < 0.05] = np.nan
+            data[f"f{i}"] = values
+    return pd.DataFrame(data)
+
+
+def timed(func, df: pd.DataFrame, repeat: int) -> tuple:
+    """Лучшее время из repeat запусков и результат последнего"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(df)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--columns", type=int, default=100)
+    parser.add_argument("--text-share", type=float, default=0.0, help="доля текстовых колонок")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows, args.columns, args.text_share, args.seed)
+    # Немного повторов строк, чтобы дубликаты не были тривиальным нулём
+    df = pd.concat([df, df.head(args.rows // 100)], ignore_index=True)
+    print(f"frame: {len(df)} x {len(df.columns)}, {df.memory_usage(deep=True).sum() / 2 ** 20:.0f} MB")
+
+    old_seconds, old = timed(baseline_profile, df, args.repeat)
+    new_seconds, new = timed(profile_dataset, df, args.repeat)
+
+    mismatched = [key for key in old if old[key] != new[key]]
+    if mismatched:
+        raise SystemExit(f"profiles differ in: {', '.join(mismatched)}")
+
+    print(f"baseline: {old_seconds:.2f}s")
+    print(f"profile_dataset: {new_seconds:.2f}s")
+    print(f"speedup: {old_seconds / new_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -721,6 +721,78 @@ function AIPanel({ dataset }) {
   );
 }
 
+// Нарушения правила страницами из /violations: cursor → next_cursor
+function ViolationPager({ datasetId, runId, rule }) {
+  const [items, setItems]   = useState([]);
+  const [cursor, setCursor] = useState(0);
+  const [loading, setLoading] = useState(false);
+
+  useEffect(() => { setItems([]); setCursor(0); }, [runId, rule.rule_id]);
+
+  const loadMore = async () => {
+    setLoading(true);
+    try {
+      const page = await api(
+        `/datasets/${datasetId}/validate/${runId}/rules/${rule.rule_id}/violations?cursor=${cursor}&limit=50`
+      );
+      setItems(prev => [...prev, ...page.violations]);
+      setCursor(page.next_cursor);
+    } catch(e) { alert("Violations error: " + e.message); }
+    finally { setLoading(false); }
+  };
+
+  return (
+    <div style={{ marginTop: ".75rem" }}>
+      <p style={{
+        fontSize: ".75rem",
+        color: C.muted,
+        marginBottom: ".4rem",
+        textTransform: "uppercase",
+        letterSpacing: ".05em"
+      }}>
+        Violations ({rule.violations} total{items.length > 0 && `, showing ${items.length}`})
+      </p>
+      {items.length > 0 && (
+        <div style={{
+          maxHeight: "200px",
+          overflowY: "auto",
+          background: `${C.red}08`,
+          borderRadius: 6,
+          padding: ".5rem"
+        }}>
+          {items.map((v, i) => (
+            <div key={i} style={{
+              padding: ".4rem .6rem",
+              marginBottom: ".3rem",
+              background: C.card,
+              borderRadius: 4,
+              border: `1px solid ${C.border}`,
+              fontFamily: "'Space Mono',monospace",
+              fontSize: ".72rem"
+            }}>
+              <div style={{ color: C.red, marginBottom: ".2rem" }}>
+                Row {v.row_index}: <span style={{ color: C.white }}>{v.column_value}</span>
+              </div>
+              <div style={{ color: C.muted, fontSize: ".68rem" }}>
+                {Object.entries(v.row_data).map(([k, val]) => (
+                  <span key={k} style={{ marginRight: ".5rem" }}>
+                    {k}: {val}
+                  </span>
+                ))}
+              </div>
+            </div>
+          ))}
+        </div>
+      )}
+      {cursor !== null && (
+        <button className="btn btn-ghost" style={{ marginTop: ".4rem" }} onClick={loadMore} disabled={loading}>
+          {loading ? <><span className="spin">⟳</span> Loading…</> : items.length ? "Load more" : "Show violations"}
+        </button>
+      )}
+    </div>
+  );
+}
+
 // ══════════════════════════════════════════════════════════════════════════════
 // RULES PANEL
 // ══════════════════════════════════════════════════════════════════════════════
@@ -738,7 +810,11 @@ function RulesPanel({ dataset }) {
     } catch {}
   }, [dataset.id]);
 
-  useEffect(() => { loadRules(); setValResult(null); }, [loadRules]);
+  useEffect(() => {
+    loadRules();
+    setValResult(null);
+    api(`/datasets/${dataset.id}/validate/latest`).then(setValResult).catch(() => {});
+  }, [loadRules, dataset.id]);
 
   const addRule = async () => {
     let params = {};
@@ -776,6 +852,10 @@ function RulesPanel({ dataset }) {
     not_null: '{}',
     unique: '{}',
     regex: '{"pattern":"^[\\\\w.-]+@[\\\\w.-]+\\\\.\\\\w+$"}',
+    in_set: '{"values":["A","B","C"]}',
+    min_length: '{"length":1}',
+    max_length: '{"length":255}',
+    compare: '{"op":"<=","other":"column_b"}',
   };
 
   return (
@@ -819,6 +899,10 @@ function RulesPanel({ dataset }) {
               <option value="not_null">not_null</option>
               <option value="unique">unique</option>
               <option value="regex">regex</option>
+              <option value="in_set">in_set</option>
+              <option value="min_length">min_length</option>
+              <option value="max_length">max_length</option>
+              <option value="compare">compare</option>
             </select>
           </div>
           <div>
@@ -948,49 +1032,9 @@ function RulesPanel({ dataset }) {
           {r.message}
         </p>
 
-        {/* Показываем нарушения */}
-        {r.violation_details && r.violation_details.length > 0 && (
-          <div style={{ marginTop: ".75rem" }}>
-            <p style={{
-              fontSize: ".75rem",
-              color: C.muted,
-              marginBottom: ".4rem",
-              textTransform: "uppercase",
-              letterSpacing: ".05em"
-            }}>
-              Violations ({r.violations} total, showing first {r.violation_details.length}):
-            </p>
-            <div style={{
-              maxHeight: "200px",
-              overflowY: "auto",
-              background: `${C.red}08`,
-              borderRadius: 6,
-              padding: ".5rem"
-            }}>
-              {r.violation_details.map((v, i) => (
-                <div key={i} style={{
-                  padding: ".4rem .6rem",
-                  marginBottom: ".3rem",
-                  background: C.card,
-                  borderRadius: 4,
-                  border: `1px solid ${C.border}`,
-                  fontFamily: "'Space Mono',monospace",
-                  fontSize: ".72rem"
-                }}>
-                  <div style={{ color: C.red, marginBottom: ".2rem" }}>
-                    Row {v.row_index}: <span style={{ color: C.white }}>{v.column_value}</span>
-                  </div>
-                  <div style={{ color: C.muted, fontSize: ".68rem" }}>
-                    {Object.entries(v.row_data).map(([k, val]) => (
-                      <span key={k} style={{ marginRight: ".5rem" }}>
-                        {k}: {val}
-                      </span>
-                    ))}
-                  </div>
-                </div>
-              ))}
-            </div>
-          </div>
+        {/* Нарушения подгружаются постранично */}
+        {r.violations > 0 && (
+          <ViolationPager datasetId={dataset.id} runId={valResult.run_id} rule={r} />
         )}
       </div>
     ))}
@@ -1005,6 +1049,9 @@ function RulesPanel({ dataset }) {
 // ══════════════════════════════════════════════════════════════════════════════
 function VersionsPanel({ dataset }) {
   const [versions, setVersions] = useState([]);
+  const [timeline, setTimeline] = useState([]);
+  const [timelineLoading, setTimelineLoading] = useState(false);
+  const [timelineError, setTimelineError] = useState(null);
   const [comparison, setComparison] = useState(null);
   const [selectedV1, setSelectedV1] = useState(null);
   const [selectedV2, setSelectedV2] = useState(null);
@@ -1018,12 +1065,28 @@ function VersionsPanel({ dataset }) {
     } catch {}
   }, [dataset.id]);
 
+  // Дрейф считается на сервере при первом запросе — грузим отдельно, не блокируя список версий
+  const loadTimeline = useCallback(async () => {
+    setTimelineLoading(true);
+    setTimelineError(null);
+    try {
+      const data = await api(`/datasets/${dataset.id}/timeline`);
+      setTimeline(data.pairs || []);
+    } catch (e) {
+      setTimeline([]);
+      setTimelineError(e.message);
+    } finally {
+      setTimelineLoading(false);
+    }
+  }, [dataset.id]);
+
   useEffect(() => {
     loadVersions();
+    loadTimeline();
     setComparison(null);
     setSelectedV1(null);
     setSelectedV2(null);
-  }, [loadVersions]);
+  }, [loadVersions, loadTimeline]);
 
   const uploadNewVersion = async (file) => {
     if (!file || !file.name.endsWith(".csv")) {
@@ -1036,6 +1099,7 @@ function VersionsPanel({ dataset }) {
     try {
       await api(`/datasets/${dataset.id}/new-version`, { method: "POST", body: fd });
       loadVersions();
+      loadTimeline();
       alert("✓ New version uploaded!");
     } catch (e) {
       alert("Upload failed: " + e.message);
@@ -1138,6 +1202,48 @@ function VersionsPanel({ dataset }) {
         </div>
       </Card>
 
+      {/* Drift between consecutive versions */}
+      {(timeline.length > 0 || timelineLoading || timelineError) && (
+        <Card>
+          <h4 style={{ fontSize: ".78rem", color: C.muted, letterSpacing: ".1em",
+                       textTransform: "uppercase", marginBottom: "1rem" }}>
+            Drift Timeline
+          </h4>
+          {timelineLoading && (
+            <p style={{ fontSize: ".82rem", color: C.muted }}>
+              <span className="spin">⟳</span> Computing drift between versions…
+            </p>
+          )}
+          {timelineError && !timelineLoading && (
+            <p style={{ fontSize: ".82rem", color: C.red }}>
+              Drift timeline unavailable: {timelineError}{" "}
+              <button className="btn btn-ghost" onClick={loadTimeline}>Retry</button>
+            </p>
+          )}
+          <div style={{ display: "flex", flexDirection: "column", gap: ".4rem" }}>
+            {timeline.map((pair) => (
+              <div key={`${pair.from.id}-${pair.to.id}`}
+                   style={{ display: "flex", alignItems: "center", gap: ".75rem", cursor: "pointer" }}
+                   onClick={() => setComparison({
+                     dataset_a: pair.from, dataset_b: pair.to,
+                     drift_score: pair.drift_score, comparison: pair.comparison
+                   })}>
+                <span style={{ fontFamily: "'Space Mono',monospace", fontSize: ".8rem", color: C.muted }}>
+                  v{pair.from.version} → v{pair.to.version}
+                </span>
+                <span style={{ fontSize: ".82rem", fontWeight: 700, flex: 1,
+                               color: driftColor(pair.drift_score?.overall) }}>
+                  {pair.drift_score?.label}
+                </span>
+                <span style={{ fontSize: ".74rem", color: C.muted }}>
+                  {pair.drift_score?.issues_count || 0} issues
+                </span>
+              </div>
+            ))}
+          </div>
+        </Card>
+      )}
+
       {/* Compare button */}
       {selectedV1 && selectedV2 && (
         <div style={{ textAlign: "center" }}>
@@ -1306,6 +1412,20 @@ function VersionsPanel({ dataset }) {
                         </span>
                       </p>
                     )}
+                    {drift.distribution_status !== undefined && (
+                      <p style={{ fontSize: ".78rem", color: C.text }}>
+                        Distribution: {drift.psi !== undefined
+                          ? `PSI ${drift.psi}, KS ${drift.ks_statistic}`
+                          : `JS ${drift.js_distance}, χ² ${drift.chi2}`}
+                        <span style={{
+                          color: drift.distribution_status === "significant_shift" ? C.red :
+                                 drift.distribution_status === "moderate_shift" ? C.amber : C.muted,
+                          marginLeft: ".4rem"
+                        }}>
+                          ({drift.distribution_status.replace("_", " ")})
+                        </span>
+                      </p>
+                    )}
                   </div>
                 ))}
               </div>